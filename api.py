@@ -0,0 +1,278 @@
+import json
+from datetime import datetime
+from typing import Dict, List
+
+from flask import Blueprint, Response, current_app, request
+
+from filters import show_filters
+from forms import DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES, Genre
+from models import Artist, Show, Venue, db, genre_list, with_genre
+from pagination import keyset_page
+from routing import read_only
+from schedule import Slot, find_conflicts
+from search import search_engine
+
+# orjson serializes several times faster than the json module; it is
+# optional and only used when installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+#----------------------------------------------------------------------------#
+# Serialization.
+#----------------------------------------------------------------------------#
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(value)
+
+
+def dumps(data) -> bytes:
+    """Serialize with orjson when it is installed, else the json module."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=_json_default, separators=(',', ':')).encode()
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api.errorhandler(APIError)
+def api_error(error):
+    return json_response({'error': error.message}, error.status)
+
+#----------------------------------------------------------------------------#
+# Resources.
+#----------------------------------------------------------------------------#
+
+# Field name -> column, per resource. Every field is selected as its own
+# column (or correlated subquery), so ?fields= decides what the query reads.
+VENUE_FIELDS = {
+    'id': lambda: Venue.id,
+    'name': lambda: Venue.name,
+    'city': lambda: Venue.city,
+    'state': lambda: Venue.state,
+    'address': lambda: Venue.address,
+    'phone': lambda: Venue.phone,
+    'email': lambda: Venue.email,
+    'website': lambda: Venue.website,
+    'facebook_link': lambda: Venue.facebook_link,
+    'image_link': lambda: Venue.image_link,
+    'seeking_talent': lambda: Venue.seeking_talent,
+    'seeking_description': lambda: Venue.seeking_description,
+    'genres': lambda: genre_list(Venue),
+    'num_upcoming_shows': lambda: Venue.upcoming_show_count.label('num_upcoming_shows'),
+    'next_show_at': lambda: Venue.next_show_at,
+}
+
+ARTIST_FIELDS = {
+    'id': lambda: Artist.id,
+    'name': lambda: Artist.name,
+    'city': lambda: Artist.city,
+    'state': lambda: Artist.state,
+    'phone': lambda: Artist.phone,
+    'email': lambda: Artist.email,
+    'website': lambda: Artist.website,
+    'facebook_link': lambda: Artist.facebook_link,
+    'image_link': lambda: Artist.image_link,
+    'seeking_venue': lambda: Artist.seeking_venue,
+    'seeking_description': lambda: Artist.seeking_description,
+    'genres': lambda: genre_list(Artist),
+    'num_upcoming_shows': lambda: Artist.upcoming_show_count.label('num_upcoming_shows'),
+    'next_show_at': lambda: Artist.next_show_at,
+}
+
+SHOW_FIELDS = {
+    'id': lambda: Show.id,
+    'start_time': lambda: Show.start_time,
+    'venue_id': lambda: Show.venue_id,
+    'venue_name': lambda: Venue.name.label('venue_name'),
+    'artist_id': lambda: Show.artist_id,
+    'artist_name': lambda: Artist.name.label('artist_name'),
+    'artist_image_link': lambda: Artist.image_link.label('artist_image_link'),
+    'duration': lambda: Show.duration,
+}
+
+DEFAULT_FIELDS = {
+    'venues': ['id', 'name', 'city', 'state', 'num_upcoming_shows'],
+    'artists': ['id', 'name', 'city', 'state', 'num_upcoming_shows'],
+    'shows': ['id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name'],
+}
+
+
+def requested_fields(available: Dict, default: List[str]) -> List[str]:
+    """The ?fields= list, validated against the resource's fields."""
+    fields = request.args.get('fields')
+    if not fields:
+        return default
+    fields = list(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise APIError(f'Unknown field(s): {", ".join(unknown)}')
+    return fields
+
+
+def _rows(rows, fields):
+    return [{f: getattr(row, f) for f in fields} for row in rows]
+
+
+def _genres(data):
+    for item in data:
+        if 'genres' in item:
+            item['genres'] = item['genres'].split(',') if item['genres'] else []
+    return data
+
+
+def _genre_criteria(model):
+    genre = request.args.get('genre')
+    if not genre:
+        return []
+    try:
+        return [with_genre(model, Genre(genre).value)]
+    except ValueError:
+        raise APIError(f'Unknown genre: {genre}')
+
+
+def _list(model, available, kind):
+    fields = requested_fields(available, DEFAULT_FIELDS[kind])
+    # The cursor is built from the id, so it is always selected.
+    columns = [available[f]() for f in dict.fromkeys(['id'] + fields)]
+    query = db.session.query(*columns).filter(*_genre_criteria(model))
+    try:
+        page, cursor = keyset_page(query, (model.id,), key=lambda row: (row.id,))
+    except ValueError as e:
+        raise APIError(str(e))
+    return json_response({'data': _genres(_rows(page, fields)), 'next': cursor})
+
+
+def _detail(model, available, kind, entity_id):
+    fields = requested_fields(available, DEFAULT_FIELDS[kind])
+    row = (
+        db.session.query(*[available[f]() for f in fields])
+        .filter(model.id == entity_id)
+        .first()
+    )
+    if row is None:
+        raise APIError('Not found', 404)
+    return json_response({'data': _genres(_rows([row], fields))[0]})
+
+
+@api.route('/venues')
+@read_only
+def venues():
+    return _list(Venue, VENUE_FIELDS, 'venues')
+
+
+@api.route('/venues/<int:venue_id>')
+@read_only
+def venue(venue_id):
+    return _detail(Venue, VENUE_FIELDS, 'venues', venue_id)
+
+
+@api.route('/artists')
+@read_only
+def artists():
+    return _list(Artist, ARTIST_FIELDS, 'artists')
+
+
+@api.route('/artists/<int:artist_id>')
+@read_only
+def artist(artist_id):
+    return _detail(Artist, ARTIST_FIELDS, 'artists', artist_id)
+
+
+@api.route('/shows')
+@read_only
+def shows():
+    """
+    Shows in start time order, filtered like /shows. Venue and Artist are
+    only joined when needed.
+    """
+    fields = requested_fields(SHOW_FIELDS, DEFAULT_FIELDS['shows'])
+    try:
+        filters = show_filters(request.args)
+    except ValueError as e:
+        raise APIError(str(e))
+
+    selected = list(dict.fromkeys(['id', 'start_time'] + fields))
+    query = db.session.query(*[SHOW_FIELDS[f]() for f in selected]).select_from(Show)
+    if filters.joins_venue or any(f.startswith('venue_') and f != 'venue_id' for f in fields):
+        query = query.join(Venue, Show.venue_id == Venue.id)
+    if any(f.startswith('artist_') and f != 'artist_id' for f in fields):
+        query = query.join(Artist, Show.artist_id == Artist.id)
+
+    try:
+        page, cursor = keyset_page(
+            query.filter(*filters.criteria), (Show.start_time, Show.id),
+            key=lambda row: (row.start_time, row.id)
+        )
+    except ValueError as e:
+        raise APIError(str(e))
+    return json_response({'data': _rows(page, fields), 'next': cursor})
+
+
+def _slot(i: int, data) -> Slot:
+    try:
+        duration = int(data.get('duration') or DEFAULT_SHOW_MINUTES)
+        if not 1 <= duration <= MAX_SHOW_MINUTES:
+            raise ValueError(duration)
+        return Slot(int(data['venue_id']), int(data['artist_id']),
+                    datetime.fromisoformat(data['start_time']), duration)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise APIError(f'Slot {i} needs venue_id, artist_id, an ISO 8601 start_time '
+                       f'and optionally a duration of 1 to {MAX_SHOW_MINUTES} minutes.')
+
+
+@api.route('/shows/check', methods=['POST'])
+def check_slots():
+    """
+    Check proposed shows for double-booking. Takes {"slots": [{"venue_id",
+    "artist_id", "start_time", "duration"}, ...]} and returns, per slot, its
+    conflicts with existing shows and with the slots before it. Reads the
+    primary, as /shows/create does, so shows booked a moment ago count.
+    """
+    body = request.get_json(silent=True)
+    slots = body.get('slots') if isinstance(body, dict) else None
+    if not isinstance(slots, list):
+        raise APIError('Expected a JSON object with a list of slots.')
+    limit = current_app.config.get('SLOT_CHECK_LIMIT', 1000)
+    if len(slots) > limit:
+        raise APIError(f'At most {limit} slots can be checked at once.')
+
+    results = find_conflicts([_slot(i, data) for i, data in enumerate(slots)])
+    return json_response({'data': [
+        {'available': not conflicts, 'conflicts': conflicts} for conflicts in results
+    ]})
+
+
+@api.route('/autocomplete')
+@read_only
+def autocomplete():
+    """
+    Venue and artist names with a word starting with ?q=, names starting
+    with it first. ?type=venue or ?type=artist restricts the kind, ?limit=
+    the number of names (AUTOCOMPLETE_LIMIT by default).
+    """
+    kinds = None
+    if request.args.get('type'):
+        if request.args['type'] not in ('venue', 'artist'):
+            raise APIError('type must be venue or artist.')
+        kinds = {request.args['type']}
+    default = current_app.config.get('AUTOCOMPLETE_LIMIT', 10)
+    limit = max(1, min(request.args.get('limit', default, type=int), 50))
+    return json_response({'data': search_engine.autocomplete.complete(
+        request.args.get('q', ''), limit, kinds)})
+
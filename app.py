@@ -2,42 +2,137 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
 import logging
 import re
+import threading
+from functools import lru_cache
 from logging import FileHandler, Formatter
 
-import babel
-import dateutil.parser
-from flask import (Flask, Response, abort, flash, jsonify, make_response,
-                   redirect, render_template, request, url_for)
-from sqlalchemy import func, or_
-
-from forms import ArtistForm, ShowForm, VenueForm
-from models import Artist, Show, Venue, app, datetime, db
+import click
+from flask import (Blueprint, Flask, Response, abort, current_app, flash,
+                   jsonify, make_response, redirect, render_template, request,
+                   session, stream_with_context, url_for)
+from sqlalchemy import func, literal_column, or_
+
+from api import api
+from cache import response_cache
+from counters import roll_shows_command
+from directory import venue_directory
+from exporter import EXPORTS, FORMATS, export, export_command
+from filters import show_filters
+from forms import DEFAULT_SHOW_MINUTES, ArtistForm, Genre, ShowForm, VenueForm
+from geo import geocode, geocode_command
+from importer import import_command
+from models import Artist, Show, Venue, datetime, db, moment, with_genre
+from pagination import (decode_cursor, encode_cursor, keyset_page, next_page_url,
+                        page_size)
+from metrics import metrics
+from profiling import profiler
+from routing import read_only
+from schedule import Slot, find_conflicts, is_overlap_error
+from search import search_engine
+
+bp = Blueprint('main', __name__)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+# babel and dateutil are imported on first use to keep worker startup cheap.
+
+@lru_cache(maxsize=None)
+def _datetime_pattern(format):
+    import babel.dates
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=None)
+def _datetime_locale():
+    import babel.dates
+    return babel.Locale.parse(babel.dates.LC_TIME)
+
+
 def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+    """
+    Format a datetime with a babel pattern. Takes datetime objects as they
+    come from the database; strings are still parsed for older callers.
+    """
+    if isinstance(value, str):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    return _datetime_pattern(format).apply(value, _datetime_locale())
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
 
 
-app.jinja_env.filters['datetime'] = format_datetime
+def genre_filter():
+    """The ?genre= argument of the request, checked against the Genre enum."""
+    genre = request.args.get('genre')
+    # An empty ?genre= is the "any genre" option of the filter forms.
+    if not genre:
+        return None
+    try:
+        return Genre(genre).value
+    except ValueError:
+        abort(400)
+
+
+def detail_etag(model, entity_id: int) -> str:
+    """
+    Strong ETag for the detail page of a venue or artist, built from its
+    version and the start time of its next upcoming show. The version covers
+    edits and added or removed shows; the next show's start time changes when
+    that show moves from upcoming to past. 404s if the entity doesn't exist.
+    """
+    row = db.session.query(model.version, model.next_show_at).filter(model.id == entity_id).first()
+    if row is None:
+        abort(404)
+    version, next_show_at = row
+    if next_show_at is not None and next_show_at < datetime.utcnow():
+        # The show has started but the counters haven't been rolled yet.
+        next_show_at = (
+            db.session.query(func.min(Show.start_time))
+            .filter(getattr(Show, model.show_fk) == entity_id,
+                    Show.start_time >= datetime.utcnow())
+            .scalar()
+        )
+    next_show_at = next_show_at.isoformat() if next_show_at else 'none'
+    return f'{model.__tablename__.lower()}-{entity_id}-{version}-{next_show_at}'
+
+
+def not_modified(etag: str):
+    """
+    A 304 response if the client already has this version of the page.
+    Never for pages carrying flashed messages, which are rendered once.
+    """
+    if '_flashes' not in session and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(body: str, etag: str):
+    response = make_response(body)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 
-@app.route('/', methods=['GET'])
+@bp.route('/', methods=['GET'])
 def index():
     return render_template('pages/home.html')
 
@@ -45,59 +140,102 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@bp.route('/venues')
+@response_cache.cached('venues')
+@read_only
 def venues():
-    """Show a list all of the venues, organized by city."""
-
-    shows_by_city = {}
-
-    upcoming_shows = Show.query.filter(
-        Show.start_time > datetime.utcnow()
-    ).subquery()
+    """
+    Show a page of venues, organized by city, from the venue directory
+    snapshot. Optionally filtered by ?genre= and to one area by ?city= and
+    ?state=.
+    """
 
-    venues_query = (
-        Venue.query
-        .outerjoin(upcoming_shows, Venue.id == upcoming_shows.c.venue_id)
-        .with_entities(
-            Venue.city, Venue.state, Venue.id, Venue.name,
-            func.count(upcoming_shows.c.venue_id)
-        )
-        .group_by(Venue.id)
+    area = None
+    if 'city' in request.args or 'state' in request.args:
+        area = (request.args.get('city', ''), request.args.get('state', ''))
+    try:
+        after = request.args.get('after')
+        if after:
+            after = decode_cursor(after, (Venue.state, Venue.city, Venue.id))
+    except ValueError:
+        abort(400)
+
+    page, cursor, venue_counts = venue_directory.page(
+        page_size(), after=after, area=area, genre=genre_filter()
     )
 
-    for v in venues_query:
-        city_state = f'{v[0]}_{v[1]}'
-        location = shows_by_city.setdefault(city_state, {})
-        venues = location.setdefault('venues', [])
-        venues.append({'id': v[2], 'name': v[3], 'num_upcoming_shows': v[4]})
+    shows_by_city = {}
+    for v in page:
+        venues = shows_by_city.setdefault((v.city, v.state), [])
+        venues.append({'id': v.id, 'name': v.name, 'num_upcoming_shows': v.num_upcoming_shows})
 
     data = [
-        {'city': c.split('_')[0],
-         'state': c.split('_')[1],
-         'venues': shows_by_city[c]['venues']}
-        for c in shows_by_city
+        {'city': city,
+         'state': state,
+         'num_venues': venue_counts[(city, state)],
+         'venues': venues}
+        for (city, state), venues in shows_by_city.items()
     ]
 
-    return render_template('pages/venues.html', areas=data)
+    next_url = next_page_url(encode_cursor(cursor) if cursor else None)
+    return render_template('pages/venues.html', areas=data, next_url=next_url)
+
+
+@bp.route('/venues/nearby')
+@response_cache.cached('venues')
+@read_only
+def nearby_venues():
+    """
+    Show the venues within ?radius= km of ?lat= and ?lng=, or of the centre
+    of ?city= and ?state=, nearest first. Optionally filtered by ?genre=.
+    """
+
+    try:
+        radius = float(request.args.get('radius', current_app.config['NEARBY_RADIUS_KM']))
+        if 'lat' in request.args or 'lng' in request.args:
+            center = float(request.args['lat']), float(request.args['lng'])
+        elif request.args.get('city'):
+            center = geocode(request.args['city'], request.args.get('state', ''))
+        else:
+            center = None
+    except (KeyError, ValueError):
+        abort(400)
+    if center is not None and not (-90 <= center[0] <= 90 and -180 <= center[1] <= 180):
+        abort(400)
+    radius = max(0.0, min(radius, current_app.config['NEARBY_MAX_RADIUS_KM']))
+
+    data, next_url = [], None
+    if center is not None:
+        try:
+            after = request.args.get('after')
+            if after:
+                after = decode_cursor(after, (literal_column('distance', db.Float), Venue.id))
+        except ValueError:
+            abort(400)
+        page, cursor = venue_directory.nearby(
+            *center, radius, page_size(), after=after, genre=genre_filter()
+        )
+        data = [
+            {'id': v.id, 'name': v.name, 'city': v.city, 'state': v.state,
+             'distance': distance, 'num_upcoming_shows': v.num_upcoming_shows}
+            for distance, v in page
+        ]
+        next_url = next_page_url(encode_cursor(cursor) if cursor else None)
+
+    return render_template('pages/nearby_venues.html', venues=data, center=center,
+                           radius=radius, args=request.args, next_url=next_url)
 
 
-@app.route('/venues/search', methods=['POST'])
+@bp.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
-    """Show a list of the venues that contain the search term."""
+    """Show a list of the venues matching the search term, most relevant first."""
 
     search_term = request.form.get('search_term', '')
-    venues = Venue.query.filter(Venue.name.ilike(f'%{search_term}%'))
-    data = [
-        {
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": len(venue.upcoming_shows),
-        }
-        for venue in venues
-    ]
+    data, count = search_engine.search(Venue, search_term)
 
     response = {
-        "count": len(data),
+        "count": count,
         "data": data
     }
 
@@ -106,19 +244,24 @@ def search_venues():
     )
 
 
-@app.route('/venues/<int:venue_id>', methods=['GET'])
+@bp.route('/venues/<int:venue_id>', methods=['GET'])
+@read_only
 def show_venue(venue_id):
     """Show details for the venue with the given id."""
 
+    etag = detail_etag(Venue, venue_id)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     venue = Venue.query.get(venue_id)
     if venue:
-        past_shows = venue.past_shows
-        upcoming_shows = venue.upcoming_shows
+        past_shows, upcoming_shows = venue.past_and_upcoming_shows()
 
         data = {
             "id": venue_id,
             "name": venue.name,
-            "genres": json.loads(venue.genres),
+            "genres": venue.genres,
             "address": venue.address,
             "city": venue.city,
             "state": venue.state,
@@ -136,12 +279,12 @@ def show_venue(venue_id):
 
         }
 
-        return render_template('pages/show_venue.html', venue=data)
+        return with_etag(render_template('pages/show_venue.html', venue=data), etag)
 
     abort(404)
 
 
-@app.route('/venues/<int:venue_id>', methods=['DELETE'])
+@bp.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     """ Delete a venue by its id."""
 
@@ -149,6 +292,7 @@ def delete_venue(venue_id):
     try:
         db.session.delete(venue)
         db.session.commit()
+        response_cache.invalidate('venues', 'directory', 'shows')
         message = f'Venue {venue.name} was successfully deleted!', 'info'
     except:
         db.session.rollback()
@@ -157,7 +301,7 @@ def delete_venue(venue_id):
     return jsonify({'redirect': '/'})
 
 
-@app.route('/venues/create', methods=['GET', 'POST'])
+@bp.route('/venues/create', methods=['GET', 'POST'])
 def create_venue():
     """Either load the blank form or submit a filled form to create a new venue."""
 
@@ -165,7 +309,7 @@ def create_venue():
     if request.method == 'POST':
         if form.validate_on_submit():
             venue = Venue(name=form.name.data,
-                          genres=json.dumps(form.genres.data),
+                          genres=form.genres.data,
                           city=form.city.data,
                           state=form.state.data,
                           address=form.address.data,
@@ -175,16 +319,18 @@ def create_venue():
                           seeking_talent=form.seeking_talent.data,
                           seeking_description=form.seeking_description.data,
                           email=form.email.data)
+            venue.latitude, venue.longitude = geocode(venue.city, venue.state) or (None, None)
             try:
                 db.session.add(venue)
                 db.session.commit()
+                response_cache.invalidate('venues', 'directory')
                 message = f'Venue {venue.name} was successfully listed!', 'info'
             except Exception as e:
-                app.logger.error(e)
+                current_app.logger.error(e)
                 db.session.rollback()
                 message = f'An error occurred. Venue {venue.name} could not be listed.', 'danger'
             flash(*message)
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             errors = form.errors
             for e in errors:
@@ -192,7 +338,7 @@ def create_venue():
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     """
     Load the form to edit an existing venue. Pre-populated with the current values loaded from the db.
@@ -204,7 +350,7 @@ def edit_venue(venue_id):
     data = {
         "id": venue.id,
         "name": venue.name,
-        "genres": json.loads(venue.genres),
+        "genres": venue.genres,
         "address": venue.address,
         "city": venue.city,
         "state": venue.state,
@@ -220,15 +366,17 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=data)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     """Update the venue info using the form."""
 
     venue = Venue.query.get(venue_id)
     form = VenueForm(request.form)
     try:
+        if (venue.city, venue.state) != (form.city.data, form.state.data):
+            venue.latitude, venue.longitude = geocode(form.city.data, form.state.data) or (None, None)
         venue.name = form.name.data
-        venue.genres = json.dumps(form.genres.data)
+        venue.genres = form.genres.data
         venue.city = form.city.data
         venue.state = form.state.data
         venue.phone = form.phone.data
@@ -240,71 +388,80 @@ def edit_venue_submission(venue_id):
         venue.email = form.email.data
 
         db.session.commit()
+        response_cache.invalidate('venues', 'directory', 'shows')
         message = f'Venue ID {venue.id} was updated!', 'info'
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         db.session.rollback()
         message = f'An error occurred. Changes not saved :(', 'danger'
 
     flash(*message)
 
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 #  Artists
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')
+@bp.route('/artists')
+@response_cache.cached('artists')
+@read_only
 def artists():
-    """Show a list all of the artists."""
+    """Show a page of artists, ordered by id. Optionally filtered by ?genre=."""
 
+    artists_query = Artist.query.with_entities(Artist.id, Artist.name)
+    genre = genre_filter()
+    if genre:
+        artists_query = artists_query.filter(with_genre(Artist, genre))
+
+    try:
+        page, cursor = keyset_page(artists_query, (Artist.id,), key=lambda a: (a.id,))
+    except ValueError:
+        abort(400)
     data = [
         {
             "id": artist.id,
             "name": artist.name
         }
-        for artist in Artist.query
+        for artist in page
     ]
 
-    return render_template('pages/artists.html', artists=data)
+    return render_template('pages/artists.html', artists=data, next_url=next_page_url(cursor))
 
 
-@app.route('/artists/search', methods=['POST'])
+@bp.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
-    """Show a list of the artists that contain the search term."""
+    """Show a list of the artists matching the search term, most relevant first."""
 
     search_term = request.form.get('search_term', '')
-    artists = Artist.query.filter(Artist.name.ilike(f'%{search_term}%'))
-
-    data = [
-        {
-            "id": artist.id,
-            "name": artist.name,
-            "num_upcoming_shows": len(artist.upcoming_shows),
-        }
-        for artist in artists
-    ]
+    data, count = search_engine.search(Artist, search_term)
 
     response = {
-        "count": len(data),
+        "count": count,
         "data": data
     }
 
     return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 
-@app.route('/artists/<int:artist_id>')
+@bp.route('/artists/<int:artist_id>')
+@read_only
 def show_artist(artist_id):
     """Show details for the artist with the given id."""
 
+    etag = detail_etag(Artist, artist_id)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     artist = Artist.query.get(artist_id)
     if artist:
-        past_shows = artist.past_shows
-        upcoming_shows = artist.upcoming_shows
+        past_shows, upcoming_shows = artist.past_and_upcoming_shows()
         data = {
             "id": artist_id,
             "name": artist.name,
-            "genres": json.loads(artist.genres),
+            "genres": artist.genres,
             "city": artist.city,
             "state": artist.state,
             "phone": artist.phone,
@@ -319,12 +476,12 @@ def show_artist(artist_id):
             "upcoming_shows_count": len(upcoming_shows),
             "email": artist.email
         }
-        return render_template('pages/show_artist.html', artist=data)
+        return with_etag(render_template('pages/show_artist.html', artist=data), etag)
     else:
         abort(404)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET', 'POST'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET', 'POST'])
 def edit_artist(artist_id):
     """
     Edit an existing artist. GET to load the preexisting data and POST to
@@ -338,7 +495,7 @@ def edit_artist(artist_id):
             data = {
                 "id": artist.id,
                 "name": artist.name,
-                "genres": json.loads(artist.genres),
+                "genres": artist.genres,
                 "city": artist.city,
                 "state": artist.state,
                 "phone": artist.phone,
@@ -354,7 +511,7 @@ def edit_artist(artist_id):
             form = ArtistForm(request.form)
             try:
                 artist.name = form.name.data
-                artist.genres = json.dumps(form.genres.data)
+                artist.genres = form.genres.data
                 artist.city = form.city.data
                 artist.state = form.state.data
                 artist.phone = form.phone.data
@@ -366,20 +523,21 @@ def edit_artist(artist_id):
                 artist.email = form.email.data
 
                 db.session.commit()
+                response_cache.invalidate('artists', 'shows')
                 message = f'Artist ID {artist.id} was updated!', 'info'
             except Exception as e:
-                app.logger.error(e)
+                current_app.logger.error(e)
                 db.session.rollback()
                 message = f'An error occurred. Changes not saved :(', 'danger'
 
             flash(*message)
 
-            return redirect(url_for('show_artist', artist_id=artist_id))
+            return redirect(url_for('main.show_artist', artist_id=artist_id))
     else:
         abort(404)
 
 
-@app.route('/artists/create', methods=['GET', 'POST'])
+@bp.route('/artists/create', methods=['GET', 'POST'])
 def create_artist():
     """Either load the blank form or submit a filled form to create a new artist."""
 
@@ -387,7 +545,7 @@ def create_artist():
     if request.method == 'POST':
         if form.validate_on_submit():
             artist = Artist(name=form.name.data,
-                            genres=json.dumps(form.genres.data),
+                            genres=form.genres.data,
                             city=form.city.data,
                             state=form.state.data,
                             phone=form.phone.data,
@@ -400,13 +558,14 @@ def create_artist():
             try:
                 db.session.add(artist)
                 db.session.commit()
+                response_cache.invalidate('artists')
                 message = f'Artist {artist.name} was successfully listed!', 'info'
             except:
                 db.session.rollback()
                 message = f'An error occurred. Artist {artist.name} could not be listed.', 'danger'
 
             flash(*message)
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             errors = form.errors
             for e in errors:
@@ -417,10 +576,30 @@ def create_artist():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@bp.route('/shows')
+@response_cache.cached('shows')
+@read_only
 def shows():
+    """
+    Show a page of shows, ordered by start time. Optionally filtered by date
+    range, city, state, venue, artist and genre (see filters.show_filters).
+    """
+
+    try:
+        criteria = show_filters(request.args).criteria
+    except ValueError:
+        abort(400)
+
     show_query = db.session.query(Show, Venue, Artist).filter(Show.venue_id == Venue.id,
-                                                              Show.artist_id == Artist.id)
+                                                              Show.artist_id == Artist.id,
+                                                              *criteria)
+    try:
+        page, cursor = keyset_page(
+            show_query, (Show.start_time, Show.id),
+            key=lambda s: (s.Show.start_time, s.Show.id)
+        )
+    except ValueError:
+        abort(400)
 
     data = [
         {
@@ -429,15 +608,16 @@ def shows():
             "artist_id": s.Artist.id,
             "artist_name": s.Artist.name,
             "artist_image_link": s.Artist.image_link,
-            "start_time": str(s.Show.start_time)
+            "start_time": s.Show.start_time
         }
-        for s in show_query
+        for s in page
     ]
 
-    return render_template('pages/shows.html', shows=data)
+    return render_template('pages/shows.html', shows=data, filters=request.args,
+                           genres=[g.value for g in Genre], next_url=next_page_url(cursor))
 
 
-@app.route('/shows/create')
+@bp.route('/shows/create')
 def create_shows():
     """Load the empty form to add a new show."""
 
@@ -445,53 +625,172 @@ def create_shows():
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@bp.route('/shows/create', methods=['POST'])
 def create_show_submission():
-    """Submit the form to add a new show."""
-
-    form = request.form
+    """
+    Submit the form to add a new show. Rejected if the venue or the artist
+    is already booked for any part of it.
+    """
 
-    show = Show(artist_id=form['artist_id'],
-                venue_id=form['venue_id'],
-                start_time=form['start_time'])
+    form = ShowForm(request.form)
+    if not form.validate_on_submit():
+        errors = form.errors
+        for e in errors:
+            flash(f'{e}: {errors[e][0]}', 'danger')
+        return render_template('forms/new_show.html', form=form)
+
+    for field, model in ((form.venue_id, Venue), (form.artist_id, Artist)):
+        if field.data is None or model.query.get(field.data) is None:
+            flash(f'{field.name}: No {model.__name__.lower()} with this id.', 'danger')
+            return render_template('forms/new_show.html', form=form)
+
+    slot = Slot(form.venue_id.data, form.artist_id.data, form.start_time.data,
+                form.duration.data or DEFAULT_SHOW_MINUTES)
+    conflicts = find_conflicts([slot])[0]
+    if conflicts:
+        for c in conflicts:
+            flash(f'The {c["kind"]} is already booked from {format_datetime(c["start_time"])} '
+                  f'to {format_datetime(c["end_time"])}.', 'danger')
+        return render_template('forms/new_show.html', form=form)
+
+    show = Show(artist_id=slot.artist_id,
+                venue_id=slot.venue_id,
+                start_time=slot.start_time,
+                duration=slot.duration)
 
     try:
         db.session.add(show)
         db.session.commit()
+        response_cache.invalidate('shows', 'venues')
         message = f'Show: artist {show.artist_id} at venue {show.venue_id} was successfully listed!', 'info'
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         db.session.rollback()
-        message = f'An error occurred. Show: artist {show.artist_id} at venue {show.venue_id} could not be listed.', 'danger'
+        if is_overlap_error(e):
+            message = f'Show: artist {show.artist_id} at venue {show.venue_id} was just double-booked by someone else.', 'danger'
+        else:
+            message = f'An error occurred. Show: artist {show.artist_id} at venue {show.venue_id} could not be listed.', 'danger'
 
     flash(*message)
 
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
+
+
+#  Exports
+#  ----------------------------------------------------------------
+
+@bp.route('/export/<kind>.<format>')
+@read_only
+def export_catalog(kind, format):
+    """Stream every venue, artist or show as CSV or NDJSON, if EXPORTS_ENABLED."""
+
+    if not current_app.config.get('EXPORTS_ENABLED') or kind not in EXPORTS or format not in FORMATS:
+        abort(404)
+
+    return Response(
+        stream_with_context(export(kind, format)),
+        mimetype=FORMATS[format],
+        headers={'Content-Disposition': f'attachment; filename={kind}.{format}'}
+    )
+
+
+#  Cache
+#  ----------------------------------------------------------------
+
+@bp.route('/cache/stats')
+def cache_stats():
+    """
+    Hit and miss counters of the listing page cache in this process, in
+    debug mode only. /metrics reports them too, behind METRICS_ENABLED.
+    """
+
+    if not current_app.debug or not current_app.config.get('CACHE_ENABLED'):
+        abort(404)
+
+    return jsonify(response_cache.stats())
 
 
 #  Error Handlers
 #  ----------------------------------------------------------------
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+#----------------------------------------------------------------------------#
+# App factory.
+#----------------------------------------------------------------------------#
+
+def create_app(config=None):
+    """
+    Build the Fyyur app. `config` (a mapping or an object/import path) is
+    applied on top of config.py. Nothing here touches the database: the
+    engine connects on first use and the schema, if AUTO_CREATE_SCHEMA is set,
+    is created before the first request.
+    """
+    app = Flask(__name__)
+    app.config.from_object('config')
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    db.init_app(app)
+    moment.init_app(app)
+
+    # Flask-Migrate pulls in alembic, a large share of import time that only
+    # the `flask db` commands need, so it is only set up under the CLI.
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.register_blueprint(bp)
+    app.register_blueprint(api)
+    app.cli.add_command(import_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(roll_shows_command)
+    app.cli.add_command(geocode_command)
+
+    if app.config.get('AUTO_CREATE_SCHEMA'):
+        _create_schema_on_first_request(app)
+
+    if app.config.get('PROFILING_ENABLED'):
+        profiler.init_app(app)
+    if app.config.get('METRICS_ENABLED'):
+        metrics.init_app(app)
+
+    if not app.debug:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(
+            Formatter(
+                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
+    return app
+
+
+def _create_schema_on_first_request(app):
+    lock = threading.Lock()
+    created = []
+
+    @app.before_request
+    def create_schema():
+        if not created:
+            with lock:
+                if not created:
+                    db.create_all()
+                    created.append(True)
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -499,11 +798,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
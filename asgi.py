@@ -0,0 +1,15 @@
+"""
+ASGI entry point, serving the read-only pages on an async database driver
+(asyncpg, or aiosqlite for SQLite), e.g.
+
+    $ gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+"""
+import os
+
+from app import create_app
+from async_reads import AsyncReadApp
+
+if not os.environ.get('SECRET_KEY'):
+    raise RuntimeError('Set SECRET_KEY so that every worker signs sessions with the same key.')
+
+app = AsyncReadApp(create_app())
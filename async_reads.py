@@ -0,0 +1,188 @@
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+from urllib.parse import unquote
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.util import await_only
+from werkzeug.exceptions import HTTPException
+
+from models import db
+from routing import pool_options
+
+# Endpoints served on the async engine. Everything else, including every
+# write, runs on the sync app in a thread pool.
+ASYNC_ENDPOINTS = {
+    'main.venues', 'main.artists', 'main.shows', 'main.show_venue',
+    'main.show_artist', 'main.search_venues', 'main.search_artists',
+}
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_database_url(app) -> str:
+    """ASYNC_DATABASE_URL, or the primary's URL with its async driver."""
+    url = app.config.get('ASYNC_DATABASE_URL')
+    if url:
+        return url
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    return str(url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]))
+
+
+def wsgi_environ(scope: Dict, body: bytes) -> Dict:
+    """The WSGI environ of an ASGI HTTP request."""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': unquote(scope['path'], errors='surrogateescape').encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def stream_wsgi(app, environ: Dict, send: Callable[[Dict], None]):
+    """
+    Run a WSGI app and pass its response to `send` as ASGI messages, one
+    per chunk of the body, so exports and other streamed responses aren't
+    held in memory. The start message waits for the first non-empty chunk,
+    as the app may only call start_response then.
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    def send_start():
+        status, headers = started
+        send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+        })
+
+    result = app(environ, start_response)
+    try:
+        sent_start = False
+        for chunk in result:
+            if not chunk:
+                continue
+            if not sent_start:
+                send_start()
+                sent_start = True
+            send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        if not sent_start:
+            send_start()
+        send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+class AsyncReadApp:
+    """
+    ASGI application around the Flask app. The read-only pages run in the
+    event loop on an async engine: the view is the same sync code, run by
+    AsyncSession.run_sync in a greenlet with db.session bound to the async
+    engine, so it yields to other requests whenever it waits on the
+    database. Other endpoints run on the regular sync engine in a pool of
+    ASGI_THREADS threads.
+
+    Flask keeps its request state in context variables, so the same app
+    object serves both paths.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        url = async_database_url(app)
+        # The metered pool is sync only, so only the sizes carry over.
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        options.update(pool_options(app.config, url))
+        self.engine = create_async_engine(url, **options)
+        self.executor = ThreadPoolExecutor(app.config.get('ASGI_THREADS', 4),
+                                           thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        environ = wsgi_environ(scope, body)
+        if self.endpoint(environ) in ASYNC_ENDPOINTS:
+            await self.call_async(environ, send)
+        else:
+            # The worker thread hands each message to the event loop and
+            # waits for it to be sent, so a slow client holds back the
+            # producer rather than filling memory.
+            loop = asyncio.get_running_loop()
+
+            def send_from_thread(message):
+                asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+            await loop.run_in_executor(self.executor, stream_wsgi, self.app.wsgi_app,
+                                       environ, send_from_thread)
+
+    def endpoint(self, environ: Dict):
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None
+        return endpoint
+
+    async def call_async(self, environ: Dict, send):
+        session = AsyncSession(self.engine)
+        try:
+            await session.run_sync(self._call_in_greenlet, environ, send)
+        finally:
+            await session.close()
+
+    def _call_in_greenlet(self, session, environ: Dict, send):
+        # db.session is scoped to the current greenlet, which run_sync
+        # creates for this request. The app's teardown removes it again.
+        # await_only suspends the greenlet while each message is sent.
+        db.session.registry.set(session)
+        stream_wsgi(self.app.wsgi_app, environ, lambda message: await_only(send(message)))
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,44 @@
+"""
+Micro-benchmark of the `datetime` Jinja filter: per-row cost of the old
+str -> dateutil -> babel round trip against the cached native formatter.
+
+    $ python benchmarks/datetime_filter.py [rows]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import format_datetime  # noqa: E402
+
+
+def format_datetime_before(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def main(rows=5000, repeat=5):
+    start = datetime(2020, 1, 1, 20, 0)
+    times = [start + timedelta(hours=7 * i) for i in range(rows)]
+    strings = [str(t) for t in times]
+
+    cases = (
+        ('before (str + dateutil + babel)', lambda: [format_datetime_before(s, 'full') for s in strings]),
+        ('after (datetime, cached pattern)', lambda: [format_datetime(t, 'full') for t in times]),
+    )
+    for name, run in cases:
+        best = min(timeit.repeat(run, number=1, repeat=repeat))
+        print(f'{name:34} {best / rows * 1e6:8.2f} us/row')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
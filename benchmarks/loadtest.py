@@ -0,0 +1,129 @@
+"""
+Throughput of the production server profile across worker, thread and pool
+settings. Each profile starts gunicorn (gunicorn.conf.py + wsgi:app) with
+the given settings, drives it from concurrent keep-alive clients and stops
+it again.
+
+    $ python benchmarks/loadtest.py --profile 1x1x1 --profile 4x4x5 \\
+          --path /venues --path /shows --concurrency 32 --duration 20
+
+A profile is WORKERSxTHREADSxPOOL_SIZE. DATABASE_URL and SECRET_KEY are
+passed through to the server from the environment.
+
+--mode asgi runs the same profiles on uvicorn (asgi:app) instead, where
+THREADS is the size of the thread pool for the routes that stay sync. To
+compare both at high connection counts:
+
+    $ python benchmarks/loadtest.py --mode wsgi --mode asgi --profile 2x4x10 \\
+          --path /venues/1 --path /artists/1 --concurrency 256
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(mode, port, workers, threads, pool_size):
+    env = dict(os.environ,
+               BIND=f'127.0.0.1:{port}',
+               WEB_WORKERS=str(workers),
+               WEB_THREADS=str(threads),
+               ASGI_THREADS=str(threads),
+               DB_POOL_SIZE=str(pool_size),
+               SECRET_KEY=os.environ.get('SECRET_KEY', 'loadtest'))
+    if mode == 'asgi':
+        command = ['uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                   '--workers', str(workers), '--no-access-log']
+    else:
+        command = ['gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', '/dev/null', 'wsgi:app']
+    server = subprocess.Popen(
+        [sys.executable, '-m'] + command,
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('server did not come up')
+
+
+def client(port, paths, stop_at, latencies, errors):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    i = 0
+    while time.monotonic() < stop_at:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+            latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            errors.append(None)
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+
+def run_profile(mode, profile, args):
+    workers, threads, pool_size = (int(n) for n in profile.split('x'))
+    server = start_server(mode, args.port, workers, threads, pool_size)
+    try:
+        latencies, errors = [], []
+        stop_at = time.monotonic() + args.duration
+        clients = [
+            threading.Thread(target=client, args=(args.port, args.path, stop_at, latencies, errors))
+            for _ in range(args.concurrency)
+        ]
+        for t in clients:
+            t.start()
+        for t in clients:
+            t.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    print(f'{mode:>5} {profile:>10} {len(latencies) / args.duration:10.1f} '
+          f'{statistics.median(latencies) * 1000:9.1f} {percentile(0.95):9.1f} '
+          f'{percentile(0.99):9.1f} {len(errors):7}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', action='append', choices=('wsgi', 'asgi'),
+                        help='Server to run each profile on, may be repeated. Defaults to wsgi.')
+    parser.add_argument('--profile', action='append', help='WORKERSxTHREADSxPOOL_SIZE')
+    parser.add_argument('--path', action='append', help='path to request, may be repeated')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+    args.mode = args.mode or ['wsgi']
+    args.profile = args.profile or ['1x1x1', '2x4x5', '4x4x5']
+    args.path = args.path or ['/venues', '/artists', '/shows']
+
+    print(f'{args.concurrency} clients for {args.duration:g}s on {", ".join(args.path)}')
+    print(f'{"mode":>5} {"profile":>10} {"req/s":>10} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"errors":>7}')
+    for profile in args.profile:
+        for mode in args.mode:
+            run_profile(mode, profile, args)
+
+
+if __name__ == '__main__':
+    main()
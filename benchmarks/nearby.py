@@ -0,0 +1,85 @@
+"""
+Scaling of the /venues/nearby grid index (geo.GeoGrid) with the number of
+venues, against a full scan that computes every venue's distance. Venues
+are scattered around the seeded cities with the same weights as seed.py;
+each query looks for the nearest --limit venues within --radius km of a
+random point near one of those cities.
+
+    $ python benchmarks/nearby.py --sizes 1000,10000,100000,1000000
+
+The grid's cost follows the number of venues near the query point, so it
+should grow far slower than the scan as the catalog grows.
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo import GeoGrid, distance_km  # noqa: E402
+from seed import CITIES, scatter  # noqa: E402
+
+
+def venue_points(rng, count):
+    cities = [c[:2] for c in CITIES]
+    weights = [c[2] for c in CITIES]
+    for venue_id in range(count):
+        city, state = rng.choices(cities, weights=weights)[0]
+        yield (*scatter(rng, city, state), venue_id)
+
+
+def scan(points, latitude, longitude, radius_km, limit):
+    found = []
+    for point_lat, point_lon, venue_id in points:
+        distance = distance_km(latitude, longitude, point_lat, point_lon)
+        if distance <= radius_km:
+            found.append((distance, venue_id))
+    return heapq.nsmallest(limit, found)
+
+
+def timed(function, queries):
+    started = time.perf_counter()
+    results = [function(*query) for query in queries]
+    return (time.perf_counter() - started) / len(queries) * 1e6, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='Comma separated venue counts.')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--radius', type=float, default=25.0, help='Search radius in km.')
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--cell-degrees', type=float, default=0.1)
+    parser.add_argument('--no-scan', action='store_true', help='Skip the full scan (slow for large sizes).')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f'{"venues":>10} {"build ms":>10} {"grid us":>10} {"scan us":>12} {"speedup":>8}')
+    for size in [int(s) for s in args.sizes.split(',')]:
+        rng = random.Random(args.seed)
+        points = list(venue_points(rng, size))
+        started = time.perf_counter()
+        grid = GeoGrid(args.cell_degrees)
+        for latitude, longitude, venue_id in points:
+            grid.add(latitude, longitude, venue_id, None)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        queries = [(*scatter(rng, *rng.choice(CITIES)[:2], spread_km=15), args.radius, args.limit)
+                   for _ in range(args.queries)]
+        grid_us, grid_results = timed(grid.nearest, queries)
+        if args.no_scan:
+            print(f'{size:>10} {build_ms:10.1f} {grid_us:10.1f} {"-":>12} {"-":>8}')
+            continue
+        scan_us, scan_results = timed(lambda *q: scan(points, *q), queries)
+        # Both must find the same venues.
+        for found, expected in zip(grid_results, scan_results):
+            assert [key for _, key, _ in found] == [key for _, key in expected]
+        print(f'{size:>10} {build_ms:10.1f} {grid_us:10.1f} {scan_us:12.1f} {scan_us / grid_us:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Benchmarks every route through the Flask test client on a synthetic
+catalog (see seed.py). Reports throughput, latency percentiles and
+queries per request for each scenario, and can save the results as a
+baseline or compare against one, exiting non-zero on a regression.
+
+    $ python benchmarks/routes.py --save baseline
+    $ python benchmarks/routes.py --compare baseline
+
+Without --database-url a temporary SQLite database is created and seeded
+with the given volumes. Baselines are stored in benchmarks/baselines/ and
+are only comparable between runs with the same volumes and database.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(ROOT, 'benchmarks', 'baselines')
+sys.path.insert(0, ROOT)
+
+# Cities and genres of the seeded catalog, for the show filters.
+CITIES = (('New York', 'NY'), ('Austin', 'TX'), ('Seattle', 'WA'), ('Memphis', 'TN'))
+GENRES = ('Rock n Roll', 'Jazz', 'Folk', 'Classical')
+SEARCH_TERMS = ('blue', 'the', 'velvet hall', 'wol', 'midnight', 'jazz', 'saints', 'neo', 'zzz')
+
+#----------------------------------------------------------------------------#
+# Scenarios.
+#----------------------------------------------------------------------------#
+
+# Each scenario maps (rng, counter, catalog) to (method, path, form data).
+
+
+def venue_form(i):
+    return {
+        'name': f'Benchmark Venue {i}', 'city': 'Austin', 'state': 'TX',
+        'address': f'{i} Main St', 'phone': '5125550100', 'genres': ['Jazz', 'Blues'],
+        'email': f'venue{i}@example.com', 'facebook_link': '', 'website': '',
+        'image_link': '', 'seeking_description': '',
+    }
+
+
+def artist_form(i):
+    return {
+        'name': f'Benchmark Artist {i}', 'city': 'Austin', 'state': 'TX',
+        'phone': '5125550100', 'genres': ['Folk'], 'email': f'artist{i}@example.com',
+        'facebook_link': '', 'website': '', 'image_link': '', 'seeking_description': '',
+    }
+
+
+def show_form(rng, i, catalog):
+    start_time = datetime.utcnow() + timedelta(days=rng.randrange(1, 365), hours=i % 24)
+    return {
+        'venue_id': str(rng.choice(catalog['venue_ids'])),
+        'artist_id': str(rng.choice(catalog['artist_ids'])),
+        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def weekend(rng):
+    """From and to of a random upcoming weekend, as ISO dates."""
+    today = datetime.utcnow().date()
+    friday = today + timedelta(days=(4 - today.weekday()) % 7 + 7 * rng.randrange(0, 20))
+    return friday.isoformat(), (friday + timedelta(days=2)).isoformat()
+
+
+def area(rng):
+    city, state = rng.choice(CITIES)
+    return f'city={quote(city)}&state={state}'
+
+
+def city_weekend(rng):
+    start, end = weekend(rng)
+    return f'from={start}&to={end}&{area(rng)}'
+
+
+SCENARIOS = {
+    'venues': lambda rng, i, c: ('GET', '/venues', None),
+    'artists': lambda rng, i, c: ('GET', '/artists', None),
+    'shows': lambda rng, i, c: ('GET', '/shows', None),
+    'venues_nearby': lambda rng, i, c: ('GET', f'/venues/nearby?{area(rng)}', None),
+    'search_venues': lambda rng, i, c: (
+        'POST', '/venues/search', {'search_term': rng.choice(SEARCH_TERMS)}),
+    'search_artists': lambda rng, i, c: (
+        'POST', '/artists/search', {'search_term': rng.choice(SEARCH_TERMS)}),
+    'autocomplete': lambda rng, i, c: (
+        'GET', f'/api/v1/autocomplete?q={quote(rng.choice(SEARCH_TERMS)[:rng.randint(1, 4)])}', None),
+    'show_venue': lambda rng, i, c: ('GET', f'/venues/{rng.choice(c["venue_ids"])}', None),
+    'show_artist': lambda rng, i, c: ('GET', f'/artists/{rng.choice(c["artist_ids"])}', None),
+    'shows_weekend': lambda rng, i, c: ('GET', f'/shows?{city_weekend(rng)}', None),
+    'shows_genre': lambda rng, i, c: (
+        'GET', f'/shows?from={weekend(rng)[0]}&genre={quote(rng.choice(GENRES))}', None),
+    'api_shows_weekend': lambda rng, i, c: ('GET', f'/api/v1/shows?{city_weekend(rng)}', None),
+    'api_shows_venue': lambda rng, i, c: (
+        'GET', f'/api/v1/shows?venue_id={rng.choice(c["venue_ids"])}&from={weekend(rng)[0]}', None),
+    'create_venue': lambda rng, i, c: ('POST', '/venues/create', venue_form(i)),
+    'create_artist': lambda rng, i, c: ('POST', '/artists/create', artist_form(i)),
+    'create_show': lambda rng, i, c: ('POST', '/shows/create', show_form(rng, i, c)),
+}
+
+#----------------------------------------------------------------------------#
+# Running.
+#----------------------------------------------------------------------------#
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run_scenario(app, name, catalog, args, queries):
+    client = app.test_client()
+    make_request = SCENARIOS[name]
+    rng = random.Random(f'{args.seed}-{name}')
+    latencies, query_counts, errors = [], [], 0
+
+    for i in range(args.warmup + args.requests):
+        method, path, data = make_request(rng, i, catalog)
+        queries[0] = 0
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            errors += 1
+        # Flashed messages would otherwise pile up in the session cookie.
+        if method == 'POST':
+            with client.session_transaction() as session:
+                session.clear()
+        if i >= args.warmup:
+            latencies.append(elapsed * 1000)
+            query_counts.append(queries[0])
+
+    latencies.sort()
+    return {
+        'rps': round(len(latencies) / (sum(latencies) / 1000), 1),
+        'p50': round(percentile(latencies, 0.50), 3),
+        'p95': round(percentile(latencies, 0.95), 3),
+        'p99': round(percentile(latencies, 0.99), 3),
+        'queries': round(sum(query_counts) / len(query_counts), 2),
+        'errors': errors,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regression messages for results that are worse than the baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        for metric in ('p50', 'p95'):
+            if result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {result[metric]}ms, baseline {base[metric]}ms')
+        if result['queries'] > base['queries'] + 0.01:
+            regressions.append(f'{name}: {result["queries"]} queries per request, '
+                               f'baseline {base["queries"]}')
+        if result['errors'] > base['errors']:
+            regressions.append(f'{name}: {result["errors"]} errors, baseline {base["errors"]}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to use instead of a temporary SQLite file.')
+    parser.add_argument('--no-seed', action='store_true', help='Use the data already in --database-url.')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario.')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run, may be repeated. Defaults to all.')
+    parser.add_argument('--cache', action='store_true', help='Keep the response cache enabled.')
+    parser.add_argument('--save', metavar='NAME', help='Save the results as a baseline.')
+    parser.add_argument('--compare', metavar='NAME', help='Compare against a saved baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed latency increase over the baseline, as a fraction.')
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+    from sqlalchemy import event
+
+    from app import create_app
+    from models import Artist, Venue, db
+    from seed import seed_database
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'WTF_CSRF_ENABLED': False,
+        'CACHE_ENABLED': args.cache,
+        'METRICS_ENABLED': False,
+        'PROFILING_ENABLED': False,
+    })
+    queries = [0]
+    with app.app_context():
+        db.create_all()
+        if not args.no_seed:
+            seed_database(args.venues, args.artists, args.shows, args.seed)
+        catalog = {
+            'venue_ids': [row[0] for row in db.session.query(Venue.id)],
+            'artist_ids': [row[0] for row in db.session.query(Artist.id)],
+        }
+        db.session.remove()
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(*args):
+            queries[0] += 1
+
+    results = {}
+    print(f'{"scenario":>18} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8} {"errors":>7}')
+    for name in args.scenario or list(SCENARIOS):
+        result = results[name] = run_scenario(app, name, catalog, args, queries)
+        print(f'{name:>18} {result["rps"]:9.1f} {result["p50"]:9.2f} {result["p95"]:9.2f} '
+              f'{result["p99"]:9.2f} {result["queries"]:8.2f} {result["errors"]:7}')
+
+    meta = {
+        'venues': args.venues, 'artists': args.artists, 'shows': args.shows,
+        'seed': args.seed, 'requests': args.requests, 'cache': args.cache,
+        'database': database_url.split(':', 1)[0],
+    }
+    if args.save:
+        os.makedirs(BASELINES, exist_ok=True)
+        with open(os.path.join(BASELINES, f'{args.save}.json'), 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Saved baseline {args.save}.')
+
+    if args.compare:
+        with open(os.path.join(BASELINES, f'{args.compare}.json')) as f:
+            baseline = json.load(f)
+        if baseline['meta'] != meta:
+            print(f'Warning: baseline was recorded with {baseline["meta"]}.')
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {args.compare}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Synthetic catalog generator. Fills the database with venues, artists and
+shows drawn from skewed distributions: a few big cities hold most venues,
+a few genres dominate, popular venues and artists get most of the shows,
+and shows fall on evenings over the past two years and the next six months.
+
+    $ DATABASE_URL=postgresql://localhost/fyyur_bench \\
+          python benchmarks/seed.py --venues 10000 --artists 20000 --shows 500000
+
+The same --seed always produces the same catalog, relative to the current
+date.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forms import Genre  # noqa: E402
+from geo import PLACES_FILE, load_places, place_key  # noqa: E402
+from importer import allocate_ids, chunks  # noqa: E402
+from models import (Artist, ArtistGenre, Show, Venue, VenueGenre, db,  # noqa: E402
+                    refresh_show_counters)
+from search import search_engine  # noqa: E402
+
+# (city, state, weight): roughly by size of the live music scene.
+CITIES = (
+    ('New York', 'NY', 20), ('Los Angeles', 'CA', 16), ('Chicago', 'IL', 10),
+    ('Nashville', 'TN', 9), ('Austin', 'TX', 9), ('San Francisco', 'CA', 7),
+    ('Seattle', 'WA', 6), ('New Orleans', 'LA', 6), ('Atlanta', 'GA', 5),
+    ('Boston', 'MA', 5), ('Denver', 'CO', 4), ('Portland', 'OR', 4),
+    ('Philadelphia', 'PA', 4), ('Minneapolis', 'MN', 3), ('Detroit', 'MI', 3),
+    ('Memphis', 'TN', 2), ('Kansas City', 'MO', 2), ('Asheville', 'NC', 1),
+    ('Athens', 'GA', 1), ('Olympia', 'WA', 1),
+)
+
+GENRE_WEIGHTS = {
+    Genre.ROCK_N_ROLL: 14, Genre.POP: 12, Genre.HIP_HOP: 11, Genre.ALTERNATIVE: 9,
+    Genre.ELECTRONIC: 8, Genre.JAZZ: 7, Genre.COUNTRY: 7, Genre.R_AND_B: 6,
+    Genre.FOLK: 5, Genre.BLUES: 4, Genre.PUNK: 4, Genre.SOUL: 3, Genre.FUNK: 3,
+    Genre.HEAVY_METAL: 3, Genre.REGGAE: 2, Genre.CLASSICAL: 2,
+    Genre.INSTRUMENTAL: 1, Genre.MUSICAL_THEATRE: 1, Genre.OTHER: 1,
+}
+
+ADJECTIVES = (
+    'Blue', 'Velvet', 'Golden', 'Electric', 'Midnight', 'Crimson', 'Silver',
+    'Lonely', 'Wild', 'Neon', 'Rusty', 'Hollow', 'Painted', 'Broken', 'Lucky',
+    'Little', 'Royal', 'Iron', 'Copper', 'Bitter',
+)
+VENUE_NOUNS = ('Room', 'Hall', 'Tavern', 'Lounge', 'Ballroom', 'Theater',
+               'Club', 'Saloon', 'Warehouse', 'Garden', 'Cellar', 'Stage')
+ARTIST_NOUNS = ('Wolves', 'Sparrows', 'Engines', 'Ghosts', 'Rivers', 'Saints',
+                'Horses', 'Machines', 'Shadows', 'Tigers', 'Lanterns', 'Kids')
+STREETS = ('Main St', 'Broadway', 'Oak Ave', 'Elm St', 'Market St', '1st Ave',
+           'Water St', 'Union St', 'Mill Rd', 'Church St')
+
+
+def zipf_cum_weights(n, s=1.1):
+    return list(accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def pick_genres(rng):
+    genres = list(GENRE_WEIGHTS)
+    weights = list(GENRE_WEIGHTS.values())
+    count = rng.choices((1, 2, 3), weights=(5, 3, 2))[0]
+    return list(dict.fromkeys(g.value for g in rng.choices(genres, weights=weights, k=count)))
+
+
+def scatter(rng, city, state, spread_km=8):
+    """A point around the centre of a city, roughly spread_km from it."""
+    latitude, longitude = load_places(PLACES_FILE)[place_key(city, state)]
+    degrees = spread_km / 111.2
+    return (latitude + rng.gauss(0, degrees),
+            longitude + rng.gauss(0, degrees / math.cos(math.radians(latitude))))
+
+
+def entity_rows(rng, count, nouns, venue):
+    cities = [c[:2] for c in CITIES]
+    city_weights = [c[2] for c in CITIES]
+    for i in range(count):
+        city, state = rng.choices(cities, weights=city_weights)[0]
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(nouns)}'
+        if rng.random() < 0.5:
+            name = f'The {name}'
+        row = {
+            'name': f'{name} {i}' if rng.random() < 0.3 else name,
+            'city': city,
+            'state': state,
+            'phone': f'{rng.randrange(10 ** 9, 10 ** 10)}',
+            'email': f'booking{i}@example.com',
+            'website': f'https://example.com/{i}',
+            'facebook_link': f'https://www.facebook.com/{i}',
+            'image_link': f'https://images.example.com/{i}.jpg',
+            'seeking_description': rng.choice(('', 'Looking for new acts.', 'Seeking gigs.')),
+        }
+        if venue:
+            row['address'] = f'{rng.randrange(1, 2000)} {rng.choice(STREETS)}'
+            row['seeking_talent'] = rng.random() < 0.4
+            row['latitude'], row['longitude'] = scatter(rng, city, state)
+        else:
+            row['seeking_venue'] = rng.random() < 0.4
+        yield row, pick_genres(rng)
+
+
+def insert_entities(rng, model, link_class, fk, count, nouns, chunk_size):
+    ids = []
+    for chunk in chunks(entity_rows(rng, count, nouns, model is Venue), chunk_size):
+        chunk_ids = allocate_ids(model, len(chunk))
+        db.session.bulk_insert_mappings(
+            model, [dict(row, id=entity_id) for entity_id, (row, _) in zip(chunk_ids, chunk)])
+        db.session.bulk_insert_mappings(
+            link_class, [{fk: entity_id, 'genre': g}
+                         for entity_id, (_, genres) in zip(chunk_ids, chunk) for g in genres])
+        db.session.commit()
+        ids.extend(chunk_ids)
+    return ids
+
+
+def show_rows(rng, count, venue_ids, artist_ids):
+    venue_weights = zipf_cum_weights(len(venue_ids))
+    artist_weights = zipf_cum_weights(len(artist_ids))
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    # One show per venue and per artist per evening, so nothing is
+    # double-booked. Draws landing on a taken evening are skipped.
+    booked = set()
+    generated = 0
+    for _ in range(count * 20):
+        if generated == count:
+            return
+        # Roughly three past shows for every upcoming one.
+        day = rng.randrange(-730, 1) if rng.random() < 0.75 else rng.randrange(1, 183)
+        venue_id = rng.choices(venue_ids, cum_weights=venue_weights)[0]
+        artist_id = rng.choices(artist_ids, cum_weights=artist_weights)[0]
+        if ('venue', venue_id, day) in booked or ('artist', artist_id, day) in booked:
+            continue
+        booked.update((('venue', venue_id, day), ('artist', artist_id, day)))
+        generated += 1
+        yield {
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': today + timedelta(days=day, hours=rng.choice((19, 20, 21, 22)),
+                                            minutes=rng.choice((0, 30))),
+            'duration': rng.choice((60, 90, 120, 180)),
+        }
+
+
+def seed_database(venues=1000, artists=2000, shows=20000, seed=0, chunk_size=10000, echo=print):
+    """Insert a synthetic catalog. Needs an app context."""
+    rng = random.Random(seed)
+    started = time.monotonic()
+    venue_ids = insert_entities(rng, Venue, VenueGenre, 'venue_id', venues, VENUE_NOUNS, chunk_size)
+    artist_ids = insert_entities(rng, Artist, ArtistGenre, 'artist_id', artists, ARTIST_NOUNS, chunk_size)
+    echo(f'{venues} venues and {artists} artists in {time.monotonic() - started:.1f}s')
+
+    # Popularity is independent of id order.
+    rng.shuffle(venue_ids)
+    rng.shuffle(artist_ids)
+    for chunk in chunks(show_rows(rng, shows, venue_ids, artist_ids), chunk_size):
+        db.session.bulk_insert_mappings(Show, chunk)
+        db.session.commit()
+    for model, ids in ((Venue, venue_ids), (Artist, artist_ids)):
+        for chunk in chunks(ids, chunk_size):
+            refresh_show_counters(db.session, model, chunk)
+            db.session.commit()
+    search_engine.reset()
+    echo(f'{shows} shows in {time.monotonic() - started:.1f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed_database(args.venues, args.artists, args.shows, args.seed, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Cold start of a worker: time to import the app, build it with create_app()
+and serve its first response, each measured in a fresh interpreter.
+
+    $ python benchmarks/startup.py [runs] [path]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = '''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "first_response": served - created,
+    "total": served - start,
+    "status": response.status_code,
+}))
+'''
+
+
+def run_worker(path):
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER, path], cwd=ROOT, check=True,
+        stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(runs=10, path='/'):
+    results = [run_worker(path) for _ in range(runs)]
+    print(f'{runs} cold starts, GET {path} -> {results[0]["status"]}')
+    for phase in ('import', 'create_app', 'first_response', 'total'):
+        times = sorted(r[phase] * 1000 for r in results)
+        print(f'{phase:15} median {statistics.median(times):8.1f} ms   max {times[-1]:8.1f} ms')
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 10, *args[1:2])
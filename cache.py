@@ -0,0 +1,152 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from flask import Response, current_app, make_response, request, session
+from werkzeug.utils import import_string
+
+
+class CacheBackend:
+    """
+    Interface for the storage behind ResponseCache. Implement it on top of a
+    shared store (e.g. Redis or memcached) to share cached pages between
+    workers, and point CACHE_BACKEND at the class.
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    """In-process least recently used cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 1024, default_ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class ResponseCache:
+    """
+    Caches rendered GET responses of the listing pages, grouped by tag.
+
+    Each tag has a version token stored in the backend and included in the
+    key of every response cached under it. Invalidating a tag replaces its
+    token, which retires exactly that tag's entries (in every worker, if the
+    backend is shared) without having to enumerate them.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._backend = None
+        self._lock = threading.Lock()
+        # `+= 1` isn't atomic across threads.
+        self._stats_lock = threading.Lock()
+
+    @property
+    def backend(self) -> CacheBackend:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    config = current_app.config
+                    backend_class = config.get('CACHE_BACKEND', LRUCache)
+                    if isinstance(backend_class, str):
+                        backend_class = import_string(backend_class)
+                    self._backend = backend_class(**config.get('CACHE_BACKEND_OPTIONS', {}))
+        return self._backend
+
+    def version(self, tag: str) -> str:
+        """Current version token of `tag`; changes whenever the tag is invalidated."""
+        key = f'tag:{tag}'
+        version = self.backend.get(key)
+        if version is None:
+            # A random token rather than a counter, so a version evicted from
+            # the backend can never come back and match stale entries.
+            version = uuid.uuid4().hex
+            self.backend.set(key, version, ttl=0)
+        return version
+
+    def invalidate(self, *tags: str):
+        for tag in tags:
+            self.backend.delete(f'tag:{tag}')
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def cached(self, tag: str):
+        """Cache the decorated view's 200 responses under `tag`."""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Pages carrying flashed messages belong to one user only.
+                if not current_app.config.get('CACHE_ENABLED', True) or '_flashes' in session:
+                    return view(*args, **kwargs)
+
+                key = f'view:{tag}:{self.version(tag)}:{request.full_path}'
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self._count(hit=True)
+                    body, mimetype = entry
+                    return Response(body, mimetype=mimetype)
+
+                self._count(hit=False)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    self.backend.set(key, (response.get_data(), response.mimetype),
+                                     ttl=current_app.config.get('CACHE_TTL'))
+                return response
+
+            return wrapper
+
+        return decorator
+
+
+response_cache = ResponseCache()
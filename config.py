@@ -1,6 +1,16 @@
 import os
 
-SECRET_KEY = os.urandom(32)
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    return default if value is None else value.lower() in ('1', 'true', 'yes', 'on')
+
+
+# Every worker must share the same key, or sessions, flashed messages and
+# CSRF tokens signed by one process are rejected by the others. The random
+# fallback is only suitable for a single development process.
+SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
+
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -8,6 +18,112 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 # DEBUG = True
 
 # Connect to the database
-SQLALCHEMY_DATABASE_URI = 'postgresql://ben@localhost:5432/fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgresql://ben@localhost:5432/fyyur')
 
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool, per worker process. A threaded worker needs at least as
+# many connections as threads; the database sees up to
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections in total.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+# Recycle connections before server-side idle timeouts close them.
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+# Test connections on checkout so a database restart doesn't surface as
+# errors on the first request of every pooled connection.
+DB_POOL_PRE_PING = _env_bool('DB_POOL_PRE_PING', True)
+
+# Pool sizes and DB_POOL_CLASS are applied per bind from its own URL
+# (routing.pool_options), since SQLite's pools don't take them.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_pre_ping': DB_POOL_PRE_PING,
+    'pool_recycle': DB_POOL_RECYCLE,
+}
+# Pool class of non-SQLite engines; metrics.init_app sets a metered pool.
+DB_POOL_CLASS = None
+
+# Read replicas, as a comma separated list of database URLs. Views marked
+# @read_only query a replica; writes and everything after them in the same
+# request go to the primary, as does every request from a client for
+# REPLICA_STICKY_SECONDS after one of its writes.
+SQLALCHEMY_REPLICA_URIS = [
+    uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri
+]
+REPLICA_STICKY_SECONDS = 5
+
+# ASGI mode (asgi:app) serves the read-only pages on an async engine for
+# ASYNC_DATABASE_URL, by default DATABASE_URL with the asyncpg or aiosqlite
+# driver, with the same pool settings. The other routes run in a pool of
+# ASGI_THREADS threads on the sync engine.
+ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 4))
+
+# Listing pages (/venues, /artists, /shows) are keyset paginated. ?limit= can
+# lower or raise the page size up to MAX_PAGE_SIZE.
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Rendered /venues, /artists and /shows pages are cached for CACHE_TTL
+# seconds and invalidated on writes. CACHE_BACKEND is a cache.CacheBackend
+# class (or its import path) built with CACHE_BACKEND_OPTIONS.
+CACHE_ENABLED = True
+CACHE_TTL = 300
+CACHE_BACKEND = 'cache.LRUCache'
+CACHE_BACKEND_OPTIONS = {'max_entries': 1024}
+
+# Most proposed shows POST /api/v1/shows/check accepts in one request.
+SLOT_CHECK_LIMIT = 1000
+
+# Off PostgreSQL, search runs on an in-process index per model, updated on
+# every write in this process and rebuilt every SEARCH_INDEX_TTL seconds.
+SEARCH_INDEX_TTL = 300
+
+# /api/v1/autocomplete completes names from an in-process prefix index of
+# at most AUTOCOMPLETE_MAX_ENTRIES keys (a few per name), updated on every
+# write in this process and rebuilt every AUTOCOMPLETE_TTL seconds.
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_ENTRIES = 200000
+AUTOCOMPLETE_TTL = 300
+
+# /venues is served from an in-process snapshot of the venue directory,
+# rebuilt after venue writes and at least every DIRECTORY_TTL seconds; show
+# writes only reload its upcoming show counts.
+DIRECTORY_TTL = 300
+
+# /venues/nearby searches a grid of GEO_CELL_DEGREES cells in that snapshot,
+# within NEARBY_RADIUS_KM unless ?radius= asks for more, up to the maximum.
+# Venues are placed by city from data/places.csv, or from GEOCODE_TABLE.
+GEO_CELL_DEGREES = 0.1
+NEARBY_RADIUS_KM = 25
+NEARBY_MAX_RADIUS_KM = 500
+GEOCODE_TABLE = os.environ.get('GEOCODE_TABLE')
+
+# /export/<kind>.<format> streams every venue and artist, contact details
+# included, to anyone who asks. Off unless enabled; `flask export` is always
+# available.
+EXPORTS_ENABLED = _env_bool('EXPORTS_ENABLED', False)
+
+# Opt-in request profiling: Server-Timing headers on every response, a log
+# of requests slower than PROFILING_SLOW_MS with their SQL, and /_profiler
+# (debug mode only), which ranks routes by p50/p95 over their last
+# PROFILING_SAMPLES requests.
+PROFILING_ENABLED = _env_bool('PROFILING_ENABLED', False)
+PROFILING_SLOW_MS = 500
+PROFILING_SLOW_LOG_SIZE = 100
+PROFILING_SAMPLES = 1000
+PROFILING_MAX_STATEMENTS = 100
+
+# Prometheus metrics at /metrics: request counts and latencies, queries and
+# template time per route, connection pool and cache statistics.
+METRICS_ENABLED = _env_bool('METRICS_ENABLED', False)
+# A directory shared by the worker processes, through which /metrics reports
+# the sum over every worker rather than only the one that answers. gunicorn
+# clears it on start (gunicorn.conf.py).
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
+# Create missing tables before the first request, in development only by
+# default: otherwise every worker would run it. Migrations (flask db
+# upgrade) remain the way to create and change the production schema.
+AUTO_CREATE_SCHEMA = _env_bool('AUTO_CREATE_SCHEMA', os.environ.get('FLASK_ENV') == 'development')
@@ -0,0 +1,43 @@
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from cache import response_cache
+from models import db, roll_show_counters
+
+
+def roll_shows() -> int:
+    """Roll started shows from upcoming to past and commit."""
+    try:
+        rolled = roll_show_counters(db.session)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if rolled:
+        response_cache.invalidate('venues', 'artists')
+    return rolled
+
+
+@click.command('roll-shows')
+@click.option('--every', type=float,
+              help='Keep running, rolling every this many seconds.')
+@with_appcontext
+def roll_shows_command(every):
+    """
+    Update the upcoming show counters of venues and artists whose next show
+    has started. Run it from cron, or keep it running with --every.
+    """
+    while True:
+        try:
+            rolled = roll_shows()
+            click.echo(f'Rolled the show counters of {rolled} venues and artists.')
+        except Exception as e:
+            if every is None:
+                raise
+            current_app.logger.error(e)
+        if every is None:
+            return
+        time.sleep(every)
@@ -0,0 +1,171 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from flask import current_app
+
+from cache import response_cache
+from geo import GeoGrid
+from models import Venue, db, genre_list
+
+
+class DirectoryEntry(NamedTuple):
+    state: str
+    city: str
+    id: int
+    name: str
+    num_upcoming_shows: int
+    genres: frozenset
+    latitude: Optional[float]
+    longitude: Optional[float]
+
+
+class Snapshot(NamedTuple):
+    # Versions of the 'directory' and 'venues' tags the snapshot is current for.
+    version: str
+    counts_version: str
+    built_at: float
+    # Sort keys (state, city, id) of the entries, for bisecting.
+    keys: List[Tuple[str, str, int]]
+    entries: List[DirectoryEntry]
+    # Number of venues per (city, state) area.
+    areas: Dict[Tuple[str, str], int]
+    # The venues that have coordinates, keyed by id, with their index in
+    # `entries` as value so a count refresh doesn't touch the grid.
+    grid: GeoGrid
+
+
+class VenueDirectory:
+    """
+    In-process snapshot of every venue, sorted by state, city and id, from
+    which /venues is served without querying the Venue table per request,
+    with a grid index of their coordinates for /venues/nearby.
+
+    The snapshot remembers the versions of two cache tags. Venue writes
+    invalidate 'directory', and the next request rebuilds the snapshot with
+    one query. Show writes only change counts: they invalidate 'venues', and
+    the next request reloads just the upcoming show counts, leaving the
+    order, areas, genres and grid as they are. DIRECTORY_TTL bounds
+    staleness when the cache backend isn't shared between workers.
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[Snapshot] = None
+        self._lock = threading.Lock()
+
+    def _build(self, version: str, counts_version: str) -> Snapshot:
+        rows = db.session.query(
+            Venue.state, Venue.city, Venue.id, Venue.name,
+            Venue.upcoming_show_count, genre_list(Venue), Venue.latitude, Venue.longitude
+        )
+        entries = sorted(
+            DirectoryEntry(state or '', city or '', venue_id, name, count,
+                           frozenset(genres.split(',')) if genres else frozenset(),
+                           latitude, longitude)
+            for state, city, venue_id, name, count, genres, latitude, longitude in rows
+        )
+        grid = GeoGrid(current_app.config.get('GEO_CELL_DEGREES', 0.1))
+        for i, entry in enumerate(entries):
+            if entry.latitude is not None and entry.longitude is not None:
+                grid.add(entry.latitude, entry.longitude, entry.id, i)
+        return Snapshot(
+            version=version,
+            counts_version=counts_version,
+            built_at=time.monotonic(),
+            keys=[(e.state, e.city, e.id) for e in entries],
+            entries=entries,
+            areas=Counter((e.city, e.state) for e in entries),
+            grid=grid,
+        )
+
+    def _with_counts(self, snapshot: Snapshot, counts_version: str) -> Snapshot:
+        counts = dict(db.session.query(Venue.id, Venue.upcoming_show_count))
+        entries = [
+            entry._replace(num_upcoming_shows=counts[entry.id])
+            if counts.get(entry.id, entry.num_upcoming_shows) != entry.num_upcoming_shows else entry
+            for entry in snapshot.entries
+        ]
+        return snapshot._replace(entries=entries, counts_version=counts_version)
+
+    def _current(self, snapshot: Optional[Snapshot], version: str, counts_version: str) -> bool:
+        ttl = current_app.config.get('DIRECTORY_TTL', 300)
+        return snapshot is not None and snapshot.version == version and \
+            snapshot.counts_version == counts_version and \
+            time.monotonic() - snapshot.built_at <= ttl
+
+    def snapshot(self) -> Snapshot:
+        version = response_cache.version('directory')
+        counts_version = response_cache.version('venues')
+        snapshot = self._snapshot
+        if not self._current(snapshot, version, counts_version):
+            with self._lock:
+                snapshot = self._snapshot
+                if self._current(snapshot, version, counts_version):
+                    return snapshot
+                if self._current(snapshot, version, snapshot and snapshot.counts_version):
+                    snapshot = self._with_counts(snapshot, counts_version)
+                else:
+                    snapshot = self._build(version, counts_version)
+                self._snapshot = snapshot
+        return snapshot
+
+    def page(self, size: int, after: Optional[Tuple] = None, area: Optional[Tuple[str, str]] = None,
+             genre: Optional[str] = None) -> Tuple[List[DirectoryEntry], Optional[Tuple], Dict]:
+        """
+        One page of at most `size` venues after the (state, city, id) cursor,
+        optionally restricted to one (city, state) area and to a genre.
+        Returns the venues, the cursor of the next page (or None) and the
+        venue count of each area.
+        """
+        snapshot = self.snapshot()
+        keys = snapshot.keys
+        start, end = 0, len(keys)
+        if area is not None:
+            city, state = area
+            start = bisect_left(keys, (state, city))
+            end = bisect_right(keys, (state, city, float('inf')))
+        if after is not None:
+            start = max(start, bisect_right(keys, tuple(after)))
+
+        page = []
+        for i in range(start, end):
+            entry = snapshot.entries[i]
+            if genre is None or genre in entry.genres:
+                if len(page) == size:
+                    last = page[-1]
+                    return page, (last.state, last.city, last.id), snapshot.areas
+                page.append(entry)
+        return page, None, snapshot.areas
+
+    def nearby(self, latitude: float, longitude: float, radius_km: float, size: int,
+               after: Optional[Tuple[float, int]] = None,
+               genre: Optional[str] = None) -> Tuple[List[Tuple[float, DirectoryEntry]], Optional[Tuple]]:
+        """
+        One page of at most `size` (distance in km, venue) within `radius_km`,
+        nearest first, after the (distance, id) cursor and optionally of a
+        genre. Returns the venues and the cursor of the next page, or None.
+        """
+        snapshot = self.snapshot()
+        after = tuple(after) if after is not None else None
+        page = []
+        while len(page) <= size:
+            # Over-fetch when filtering by genre, and keep going if that
+            # wasn't enough.
+            batch = (size + 1 - len(page)) * (1 if genre is None else 4)
+            found = snapshot.grid.nearest(latitude, longitude, radius_km, batch, after=after)
+            entries = ((distance, snapshot.entries[i]) for distance, _, i in found)
+            page.extend((distance, entry) for distance, entry in entries
+                        if genre is None or genre in entry.genres)
+            if len(found) < batch:
+                break
+            after = found[-1][:2]
+        if len(page) <= size:
+            return page, None
+        page = page[:size]
+        distance, last = page[-1]
+        return page, (distance, last.id)
+
+
+venue_directory = VenueDirectory()
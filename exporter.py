@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from typing import Iterator, List
+
+import click
+from flask.cli import with_appcontext
+
+from models import Artist, Show, Venue, db, genre_list
+
+# Rows fetched per round trip from the server-side cursor.
+YIELD_PER = 1000
+# Rows serialized into each chunk of output.
+CHUNK_ROWS = 500
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+
+def _entity_query(model, columns):
+    return db.session.query(
+        *[getattr(model, c) for c in columns], genre_list(model)
+    ).order_by(model.id)
+
+
+def venues_query():
+    return _entity_query(Venue, (
+        'id', 'name', 'city', 'state', 'address', 'phone', 'email', 'website',
+        'facebook_link', 'image_link', 'seeking_talent', 'seeking_description',
+    ))
+
+
+def artists_query():
+    return _entity_query(Artist, (
+        'id', 'name', 'city', 'state', 'phone', 'email', 'website',
+        'facebook_link', 'image_link', 'seeking_venue', 'seeking_description',
+    ))
+
+
+def shows_query():
+    # Outer joins: a show whose venue or artist is missing is still exported,
+    # with an empty name.
+    return (
+        db.session.query(
+            Show.id, Show.start_time,
+            Show.venue_id, Venue.name.label('venue_name'),
+            Show.artist_id, Artist.name.label('artist_name'),
+        )
+        .outerjoin(Venue, Show.venue_id == Venue.id)
+        .outerjoin(Artist, Show.artist_id == Artist.id)
+        .order_by(Show.id)
+    )
+
+
+EXPORTS = {
+    'venues': venues_query,
+    'artists': artists_query,
+    'shows': shows_query,
+}
+
+#----------------------------------------------------------------------------#
+# Serialization.
+#----------------------------------------------------------------------------#
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(value)
+
+
+def export_rows(kind: str):
+    """
+    Stream the rows of an export. yield_per runs the query on a server-side
+    cursor where the driver supports it, so only one batch of rows is held in
+    memory at a time.
+    """
+    query = EXPORTS[kind]()
+    columns = [c['name'] for c in query.column_descriptions]
+    return columns, query.yield_per(YIELD_PER)
+
+
+def serialize(columns: List[str], rows: Iterator, format: str) -> Iterator[str]:
+    """Render rows as CSV or NDJSON, CHUNK_ROWS at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == 'csv':
+        writer.writerow(columns)
+
+    for count, row in enumerate(rows, start=1):
+        if format == 'csv':
+            writer.writerow(v.isoformat() if isinstance(v, datetime) else v for v in row)
+        else:
+            record = dict(zip(columns, row))
+            # A list, as in the API; CSV keeps the comma separated string.
+            if 'genres' in record:
+                record['genres'] = record['genres'].split(',') if record['genres'] else []
+            buffer.write(json.dumps(record, default=_json_default))
+            buffer.write('\n')
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export(kind: str, format: str) -> Iterator[str]:
+    columns, rows = export_rows(kind)
+    return serialize(columns, rows, format)
+
+#----------------------------------------------------------------------------#
+# Command.
+#----------------------------------------------------------------------------#
+
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.option('--format', 'format', type=click.Choice(sorted(FORMATS)), default='csv',
+              show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False),
+              help='File to write to. Defaults to standard output.')
+@with_appcontext
+def export_command(kind, format, output):
+    """Export all venues, artists or shows as CSV or NDJSON."""
+    out = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    try:
+        for chunk in export(kind, format):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
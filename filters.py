@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from typing import List, Mapping, NamedTuple
+
+from forms import Genre
+from models import Artist, Show, Venue, with_genre
+
+
+class ShowFilters(NamedTuple):
+    criteria: List
+    # Whether the criteria reference Venue, which then has to be joined.
+    joins_venue: bool
+
+
+def parse_moment(value: str, end: bool = False) -> datetime:
+    """
+    An ISO 8601 date or date and time. A bare date is the start of that day,
+    or with `end`, the start of the next one, so ?to=2030-05-03 includes the
+    whole 3rd.
+    """
+    if 'T' not in value and ' ' not in value:
+        day = datetime.strptime(value, '%Y-%m-%d')
+        return day + timedelta(days=1) if end else day
+    return datetime.fromisoformat(value)
+
+
+def _id(args: Mapping, name: str):
+    value = args.get(name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise ValueError(f'{name} must be an id.')
+    return int(value)
+
+
+def show_filters(args: Mapping) -> ShowFilters:
+    """
+    Criteria for the ?from=, ?to=, ?city=, ?state=, ?venue_id=, ?artist_id=
+    and ?genre= (of the artist) arguments of a show listing. The time range
+    is half-open, [from, to). Raises ValueError with a message on bad input.
+    """
+    criteria, joins_venue = [], False
+    try:
+        if args.get('from'):
+            criteria.append(Show.start_time >= parse_moment(args['from']))
+        if args.get('to'):
+            criteria.append(Show.start_time < parse_moment(args['to'], end=True))
+    except ValueError:
+        raise ValueError('from and to must be ISO 8601 dates or dates and times.')
+
+    if args.get('city'):
+        criteria.append(Venue.city == args['city'])
+        joins_venue = True
+    if args.get('state'):
+        criteria.append(Venue.state == args['state'].upper())
+        joins_venue = True
+
+    venue_id = _id(args, 'venue_id')
+    if venue_id is not None:
+        criteria.append(Show.venue_id == venue_id)
+    artist_id = _id(args, 'artist_id')
+    if artist_id is not None:
+        criteria.append(Show.artist_id == artist_id)
+
+    if args.get('genre'):
+        try:
+            genre = Genre(args['genre']).value
+        except ValueError:
+            raise ValueError(f'Unknown genre: {args["genre"]}')
+        criteria.append(with_genre(Artist, genre, Show.artist_id))
+
+    return ShowFilters(criteria, joins_venue)
@@ -1,12 +1,13 @@
 import re
 from datetime import datetime
 from enum import Enum
+from functools import lru_cache
 
-import us
 from flask_wtf import FlaskForm
-from wtforms import (BooleanField, DateTimeField, SelectField,
+from wtforms import (BooleanField, DateTimeField, IntegerField, SelectField,
                      SelectMultipleField, StringField, TextAreaField)
-from wtforms.validators import URL, AnyOf, DataRequired, ValidationError
+from wtforms.validators import (URL, AnyOf, DataRequired, NumberRange,
+                                Optional, ValidationError)
 
 
 class Genre(Enum):
@@ -31,11 +32,26 @@ class Genre(Enum):
     OTHER = 'Other'
 
 
+# Show durations, in minutes. The conflict checks rely on the maximum.
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 24 * 60
+
+
 class ShowForm(FlaskForm):
-    artist_id = StringField('artist_id')
-    venue_id = StringField('venue_id')
+    artist_id = IntegerField('artist_id', validators=[Optional()])
+    venue_id = IntegerField('venue_id', validators=[Optional()])
     start_time = DateTimeField('start_time', validators=[DataRequired()],
-                               default=datetime.today())
+                               default=datetime.today)
+    duration = IntegerField('duration', default=DEFAULT_SHOW_MINUTES,
+                            validators=[Optional(), NumberRange(min=1, max=MAX_SHOW_MINUTES)])
+
+
+@lru_cache(maxsize=None)
+def state_choices():
+    # The us package loads its whole state table on import, so it is only
+    # imported the first time a form needs it.
+    import us
+    return [(state.abbr, state.abbr) for state in us.states.STATES]
 
 
 def validate_phone(form, field):
@@ -51,9 +67,7 @@ class VenueForm(FlaskForm):
     # Required Fields
     name = StringField('name', validators=[DataRequired()])
     city = StringField('city', validators=[DataRequired()])
-    state = SelectField(
-        'state', validators=[DataRequired()],
-        choices=[(state.abbr, state.abbr) for state in us.states.STATES])
+    state = SelectField('state', validators=[DataRequired()])
     address = StringField('address', validators=[DataRequired()])
     genres = SelectMultipleField('genres', validators=[DataRequired()],
                                  choices=[(g.value, g.value) for g in Genre])
@@ -67,14 +81,16 @@ class VenueForm(FlaskForm):
     website = StringField('website')
     seeking_description = TextAreaField('seeking_description')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.state.choices = state_choices()
+
 
 class ArtistForm(FlaskForm):
     # Required Fields
     name = StringField('name', validators=[DataRequired()])
     city = StringField('city', validators=[DataRequired()])
-    state = SelectField(
-        'state', validators=[DataRequired()],
-        choices=[(state.abbr, state.abbr) for state in us.states.STATES])
+    state = SelectField('state', validators=[DataRequired()])
     genres = SelectMultipleField('genres', validators=[DataRequired()],
                                  choices=[(g.value, g.value) for g in Genre])
     email = StringField('email', validators=[DataRequired()])
@@ -86,3 +102,7 @@ class ArtistForm(FlaskForm):
     facebook_link = StringField('facebook_link')
     website = StringField('website')
     seeking_description = TextAreaField('seeking_description')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.state.choices = state_choices()
@@ -0,0 +1,189 @@
+import csv
+import heapq
+import math
+import os
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from cache import response_cache
+from models import Venue, db
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+PLACES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'places.csv')
+
+#----------------------------------------------------------------------------#
+# Geocoding.
+#----------------------------------------------------------------------------#
+
+# Venues are placed at the centre of their city, looked up in a local table
+# of (city, state, latitude, longitude) rows. GEOCODE_TABLE points at a
+# different table, e.g. a larger one or one keyed by neighbourhood names.
+
+
+def place_key(city: str, state: str) -> Tuple[str, str]:
+    city = ' '.join((city or '').lower().replace('.', ' ').split())
+    if city.startswith('saint '):
+        city = 'st ' + city[len('saint '):]
+    return city, (state or '').strip().upper()
+
+
+@lru_cache(maxsize=None)
+def load_places(path: str) -> Dict[Tuple[str, str], Tuple[float, float]]:
+    with open(path, newline='', encoding='utf-8') as f:
+        return {
+            place_key(row['city'], row['state']): (float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(f)
+        }
+
+
+def geocode(city: str, state: str) -> Optional[Tuple[float, float]]:
+    """(latitude, longitude) of a city, or None if it isn't in the table."""
+    places = load_places(current_app.config.get('GEOCODE_TABLE') or PLACES_FILE)
+    return places.get(place_key(city, state))
+
+
+def fill_coordinates(session, ids: Optional[Iterable[int]] = None, overwrite: bool = False) -> Tuple[int, int]:
+    """
+    Set the coordinates of venues that have none, or of every venue with
+    `overwrite`, optionally only among `ids`. Doesn't commit. Returns the
+    number of venues placed and the number whose city isn't in the table.
+    """
+    query = session.query(Venue.id, Venue.city, Venue.state)
+    if not overwrite:
+        query = query.filter(Venue.latitude.is_(None))
+    if ids is not None:
+        query = query.filter(Venue.id.in_(list(ids)))
+
+    updates, unknown = [], 0
+    for venue_id, city, state in query:
+        point = geocode(city, state)
+        if point is None:
+            unknown += 1
+        else:
+            updates.append({'id': venue_id, 'latitude': point[0], 'longitude': point[1]})
+    session.bulk_update_mappings(Venue, updates)
+    return len(updates), unknown
+
+
+@click.command('geocode')
+@click.option('--all', 'overwrite', is_flag=True, help='Also replace existing coordinates.')
+@with_appcontext
+def geocode_command(overwrite):
+    """Fill in venue coordinates from the local place table."""
+    try:
+        placed, unknown = fill_coordinates(db.session, overwrite=overwrite)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if placed:
+        response_cache.invalidate('venues', 'directory')
+    click.echo(f'Placed {placed} venues, {unknown} in cities missing from the table.')
+
+#----------------------------------------------------------------------------#
+# Spatial index.
+#----------------------------------------------------------------------------#
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoGrid:
+    """
+    Points bucketed into cells of `cell_degrees` latitude by longitude.
+
+    A nearest-first search visits rings of cells around the centre. After
+    each ring, nothing left unvisited can be closer than the edge of the
+    block visited so far, so the search stops as soon as it has enough
+    results within that distance, or the edge is beyond the radius. Its cost
+    depends on how many points are near the centre, not on how many there
+    are in total. Cells don't wrap around the antimeridian.
+    """
+
+    def __init__(self, cell_degrees: float = 0.1):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, Hashable, object]]] = {}
+        self._bounds = None
+        self.size = 0
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def add(self, lat: float, lon: float, key: Hashable, value):
+        """Add a point. `key` orders points at the same distance."""
+        cell = self._cell(lat, lon)
+        self._cells.setdefault(cell, []).append((lat, lon, key, value))
+        self.size += 1
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            b = self._bounds
+            b[0], b[1] = min(b[0], cell[0]), max(b[1], cell[0])
+            b[2], b[3] = min(b[2], cell[1]), max(b[3], cell[1])
+
+    def _edge_km(self, lat: float, lon: float, row: int, col: int, ring: int) -> float:
+        """Distance from (lat, lon) to the edge of the block `ring` cells around its cell."""
+        size = self.cell_degrees
+        north, south = (row + ring + 1) * size - lat, lat - (row - ring) * size
+        east, west = (col + ring + 1) * size - lon, lon - (col - ring) * size
+        # The nearest point of a meridian lies off the parallel, closer than
+        # the distance along it.
+        sin_lon = math.sin(math.radians(min(min(east, west), 90)))
+        return min(min(north, south) * KM_PER_DEGREE,
+                   EARTH_RADIUS_KM * math.asin(min(1.0, math.cos(math.radians(lat)) * sin_lon)))
+
+    def nearest(self, lat: float, lon: float, radius_km: float, limit: int,
+                after: Optional[Tuple[float, Hashable]] = None) -> List[Tuple[float, Hashable, object]]:
+        """
+        Up to `limit` (distance, key, value) of the points within `radius_km`,
+        nearest first, and after the (distance, key) cursor if given.
+        """
+        if self._bounds is None or limit < 1:
+            return []
+        row, col = self._cell(lat, lon)
+        min_row, max_row, min_col, max_col = self._bounds
+        found = []
+        ring = 0
+        while True:
+            for r, c in self._ring(row, col, ring):
+                if min_row <= r <= max_row and min_col <= c <= max_col:
+                    for point_lat, point_lon, key, value in self._cells.get((r, c), ()):
+                        distance = distance_km(lat, lon, point_lat, point_lon)
+                        if distance <= radius_km and (after is None or (distance, key) > after):
+                            found.append((distance, key, value))
+            edge = self._edge_km(lat, lon, row, col, ring)
+            covered = row - ring <= min_row and row + ring >= max_row and \
+                col - ring <= min_col and col + ring >= max_col
+            if covered or edge >= radius_km:
+                break
+            if len(found) >= limit and heapq.nsmallest(limit, found, key=_sort_key)[-1][0] <= edge:
+                break
+            ring += 1
+        return heapq.nsmallest(limit, found, key=_sort_key)
+
+    @staticmethod
+    def _ring(row: int, col: int, ring: int):
+        if ring == 0:
+            yield row, col
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield row - ring, c
+            yield row + ring, c
+        for r in range(row - ring + 1, row + ring):
+            yield r, col - ring
+            yield r, col + ring
+
+
+def _sort_key(item):
+    return item[0], item[1]
@@ -0,0 +1,41 @@
+# Production server profile: several worker processes, each running a pool
+# of threads. Every setting can be overridden from the environment.
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+# Keep DB_POOL_SIZE (config.py) at least this high, or threads will queue
+# for connections.
+threads = int(os.environ.get('WEB_THREADS', 4))
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+keepalive = 5
+# Restart workers now and then to bound memory growth, with jitter so they
+# don't all restart at once.
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+# The app opens no database connections until the first request, so it is
+# safe to build it once in the master before forking.
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+
+# With METRICS_DIR set, workers share their metrics through files there
+# (metrics.py): start each run from an empty directory, and drop the gauges
+# of workers that exit.
+def on_starting(server):
+    if os.environ.get('METRICS_DIR'):
+        from metrics import clear_metrics_dir
+        clear_metrics_dir(os.environ['METRICS_DIR'])
+
+
+def child_exit(server, worker):
+    if os.environ.get('METRICS_DIR'):
+        from metrics import mark_process_dead
+        mark_process_dead(os.environ['METRICS_DIR'], worker.pid)
@@ -0,0 +1,371 @@
+import csv
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from itertools import islice
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func
+from werkzeug.datastructures import MultiDict
+
+from cache import response_cache
+from forms import DEFAULT_SHOW_MINUTES, ArtistForm, ShowForm, VenueForm
+from geo import geocode
+from models import (Artist, ArtistGenre, Show, Venue, VenueGenre, db,
+                    refresh_show_counters)
+from schedule import Slot, find_conflicts
+from search import search_engine
+
+#----------------------------------------------------------------------------#
+# Reading.
+#----------------------------------------------------------------------------#
+
+
+class MalformedRow(NamedTuple):
+    """A JSON line that doesn't parse, in place of its row."""
+    raw: str
+    error: str
+
+
+def read_rows(path: str, format: str) -> Iterator[Tuple[int, Dict]]:
+    """
+    Stream (line number, row) pairs from a CSV or JSON-lines file. A JSON
+    line that doesn't parse comes out as a MalformedRow, to be rejected
+    without stopping the import.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if format == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError as e:
+                        yield line_number, MalformedRow(line.rstrip('\n'), str(e))
+
+
+def row_errors(row) -> Dict[str, List[str]]:
+    """
+    Errors making a row unusable before validation: a JSON line that isn't
+    an object, or values that aren't strings, numbers or booleans (genres
+    may also be a list of strings).
+    """
+    if isinstance(row, MalformedRow):
+        return {'row': [f'Invalid JSON: {row.error}']}
+    if not isinstance(row, dict):
+        return {'row': ['Expected a JSON object.']}
+    errors = {}
+    for key, value in row.items():
+        if key == 'genres' and isinstance(value, list):
+            if not all(isinstance(genre, str) for genre in value):
+                errors[key] = ['Expected a list of strings.']
+        elif value is not None and not isinstance(value, (str, int, float, bool)):
+            errors[key] = ['Expected a string, number or boolean.']
+    return errors
+
+
+def form_data(row: Dict) -> MultiDict:
+    """
+    Turn a CSV or JSON row without row_errors into form data. Genres may be
+    a JSON list or a comma separated string; booleans may be JSON booleans
+    or strings.
+    """
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key == 'genres':
+            genres = value if isinstance(value, list) else str(value).split(',')
+            for genre in genres:
+                if genre.strip():
+                    data.add('genres', genre.strip())
+        elif isinstance(value, bool):
+            if value:
+                data.add(key, 'y')
+        else:
+            data.add(key, str(value).strip())
+    return data
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+#----------------------------------------------------------------------------#
+# Writing.
+#----------------------------------------------------------------------------#
+
+
+def allocate_ids(model, count: int) -> List[int]:
+    """
+    Reserve `count` primary keys for a bulk insert, so genre links can be
+    inserted alongside their rows without reading the ids back one by one.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        sequence = f'"{model.__tablename__}_id_seq"'
+        result = db.session.execute(
+            db.text(f"SELECT nextval('{sequence}') FROM generate_series(1, :count)"),
+            {'count': count}
+        )
+        return [row[0] for row in result]
+    # SQLite has no sequences: take the database's write lock first (a write
+    # matching no rows is enough), so no other connection can insert
+    # between reading the highest id and the chunk's commit.
+    table = model.__table__
+    db.session.execute(table.update().where(db.false()).values(id=table.c.id))
+    start = (db.session.query(func.max(model.id)).scalar() or 0) + 1
+    return list(range(start, start + count))
+
+
+def bump_versions(model, ids):
+    """Bulk inserts skip the flush hooks, so bump versions explicitly."""
+    if ids:
+        table = model.__table__
+        db.session.execute(
+            table.update().where(table.c.id.in_(ids)).values(version=table.c.version + 1)
+        )
+
+
+class Importer(ABC):
+    """Validates rows with a form and inserts them in bulk, chunk by chunk."""
+
+    model = None
+    form_class = None
+    cache_tags = ()
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.rejected = 0
+        # Lines of the current chunk rejected so far.
+        self._rejected_lines = set()
+
+    def reject(self, line: int, row: Dict, errors):
+        self.rejected += 1
+        self._rejected_lines.add(line)
+        self.errors.write(json.dumps({'line': line, 'row': row, 'errors': errors}, default=str) + '\n')
+
+    def well_formed(self, line: int, row) -> bool:
+        """Whether the row can be validated, rejecting it if not."""
+        errors = row_errors(row)
+        if errors:
+            self.reject(line, row.raw if isinstance(row, MalformedRow) else row, errors)
+        return not errors
+
+    def validate(self, line: int, row: Dict):
+        """The validated form for the row, or None after rejecting it."""
+        form = self.form_class(formdata=form_data(row), meta={'csrf': False})
+        if form.validate():
+            return form
+        self.reject(line, row, form.errors)
+        return None
+
+    @abstractmethod
+    def import_chunk(self, rows: List[Tuple[int, Dict]]) -> int:
+        """Insert the valid rows, rejecting the others. Returns the number inserted."""
+
+    def run(self, rows: Iterator[Tuple[int, Dict]], chunk_size: int):
+        imported = read = 0
+        start = time.monotonic()
+        for chunk in chunks(rows, chunk_size):
+            read += len(chunk)
+            self._rejected_lines = set()
+            chunk = [(line, row) for line, row in chunk if self.well_formed(line, row)]
+            try:
+                inserted = self.import_chunk(chunk) if chunk else 0
+                db.session.commit()
+                imported += inserted
+            except Exception as e:
+                current_app.logger.error(e)
+                db.session.rollback()
+                # Only the rows that passed validation were lost; the others
+                # are already in the errors file.
+                accepted = [(line, row) for line, row in chunk if line not in self._rejected_lines]
+                for line, row in accepted:
+                    self.reject(line, row, {'database': [str(e)]})
+            rate = read / max(time.monotonic() - start, 1e-9)
+            click.echo(f'{read} read, {imported} imported, {self.rejected} rejected ({rate:.0f} rows/s)')
+
+        response_cache.invalidate(*self.cache_tags)
+        search_engine.reset()
+        return imported
+
+
+class EntityImporter(Importer):
+    """Venues and artists: form fields map onto columns, plus genre links."""
+
+    link_class = None
+    fk = None
+
+    def derived_columns(self, entity: Dict) -> Dict:
+        """Columns computed from the form's, rather than read from the row."""
+        return {}
+
+    def import_chunk(self, rows):
+        forms = [(line, row, self.validate(line, row)) for line, row in rows]
+        forms = [form for _, _, form in forms if form is not None]
+        if not forms:
+            return 0
+
+        ids = allocate_ids(self.model, len(forms))
+        columns = [c.name for c in self.model.__table__.columns if c.name not in ('id', 'version')]
+        entities, links = [], []
+        for entity_id, form in zip(ids, forms):
+            entity = {'id': entity_id}
+            for column in columns:
+                if column in form:
+                    data = form[column].data
+                    entity[column] = None if data == '' else data
+            entity.update(self.derived_columns(entity))
+            entities.append(entity)
+            links.extend({self.fk: entity_id, 'genre': g} for g in dict.fromkeys(form.genres.data))
+
+        db.session.bulk_insert_mappings(self.model, entities)
+        db.session.bulk_insert_mappings(self.link_class, links)
+        return len(entities)
+
+
+class VenueImporter(EntityImporter):
+    model = Venue
+    form_class = VenueForm
+    link_class = VenueGenre
+    fk = 'venue_id'
+    cache_tags = ('venues', 'directory')
+
+    def derived_columns(self, entity):
+        latitude, longitude = geocode(entity.get('city'), entity.get('state')) or (None, None)
+        return {'latitude': latitude, 'longitude': longitude}
+
+
+class ArtistImporter(EntityImporter):
+    model = Artist
+    form_class = ArtistForm
+    link_class = ArtistGenre
+    fk = 'artist_id'
+    cache_tags = ('artists',)
+
+
+class ShowImporter(Importer):
+    """
+    Shows reference their venue and artist by venue_id/artist_id or by
+    venue_name/artist_name. References are resolved with one query per
+    model per chunk.
+    """
+
+    model = Show
+    form_class = ShowForm
+    cache_tags = ('shows', 'venues')
+
+    def resolve(self, model, rows, id_key, name_key) -> Tuple[set, Dict[str, List[int]]]:
+        ids = {str(row[id_key]) for _, row in rows if row.get(id_key)}
+        names = {row[name_key] for _, row in rows if row.get(name_key) and not row.get(id_key)}
+        found_ids = set()
+        if ids:
+            valid = [int(i) for i in ids if str(i).isdigit()]
+            found_ids = {str(r[0]) for r in db.session.query(model.id).filter(model.id.in_(valid))}
+        by_name: Dict[str, List[int]] = {}
+        if names:
+            for entity_id, name in db.session.query(model.id, model.name).filter(model.name.in_(names)):
+                by_name.setdefault(name, []).append(entity_id)
+        return found_ids, by_name
+
+    def reference(self, line, row, resolved, id_key, name_key):
+        found_ids, by_name = resolved
+        if row.get(id_key):
+            if str(row[id_key]) in found_ids:
+                return int(row[id_key])
+            self.reject(line, row, {id_key: ['No such id.']})
+        elif row.get(name_key):
+            matches = by_name.get(row[name_key], [])
+            if len(matches) == 1:
+                return matches[0]
+            self.reject(line, row, {name_key: ['No match.' if not matches else 'Ambiguous name.']})
+        else:
+            self.reject(line, row, {id_key: [f'Either {id_key} or {name_key} is required.']})
+        return None
+
+    def import_chunk(self, rows):
+        venues = self.resolve(Venue, rows, 'venue_id', 'venue_name')
+        artists = self.resolve(Artist, rows, 'artist_id', 'artist_name')
+
+        candidates = []
+        for line, row in rows:
+            form = self.validate(line, row)
+            if form is None:
+                continue
+            venue_id = self.reference(line, row, venues, 'venue_id', 'venue_name')
+            if venue_id is None:
+                continue
+            artist_id = self.reference(line, row, artists, 'artist_id', 'artist_name')
+            if artist_id is None:
+                continue
+            slot = Slot(venue_id, artist_id, form.start_time.data,
+                        form.duration.data or DEFAULT_SHOW_MINUTES)
+            candidates.append((line, row, slot))
+
+        # Double bookings are rejected, against existing shows and within the file.
+        shows = []
+        conflicts = find_conflicts([slot for _, _, slot in candidates])
+        for (line, row, slot), slot_conflicts in zip(candidates, conflicts):
+            if slot_conflicts:
+                self.reject(line, row, {c['kind']: ['Already booked from {start_time} to {end_time}.'.format(**c)]
+                                        for c in slot_conflicts})
+            else:
+                shows.append(slot._asdict())
+
+        db.session.bulk_insert_mappings(Show, shows)
+        bump_versions(Venue, {s['venue_id'] for s in shows})
+        bump_versions(Artist, {s['artist_id'] for s in shows})
+        refresh_show_counters(db.session, Venue, {s['venue_id'] for s in shows})
+        refresh_show_counters(db.session, Artist, {s['artist_id'] for s in shows})
+        return len(shows)
+
+
+IMPORTERS = {
+    'venues': VenueImporter,
+    'artists': ArtistImporter,
+    'shows': ShowImporter,
+}
+
+#----------------------------------------------------------------------------#
+# Command.
+#----------------------------------------------------------------------------#
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(['csv', 'jsonl']),
+              help='Input format. Defaults to the file extension.')
+@click.option('--chunk-size', default=1000, show_default=True,
+              help='Rows validated, inserted and committed together.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False),
+              help='JSON-lines file for rejected rows. Defaults to PATH.rejected.jsonl.')
+@with_appcontext
+def import_command(kind, path, format, chunk_size, errors_path):
+    """Bulk import venues, artists or shows from a CSV or JSON-lines file."""
+    format = format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    errors_path = errors_path or f'{path}.rejected.jsonl'
+
+    if current_app.config.get('AUTO_CREATE_SCHEMA'):
+        db.create_all()
+    # The forms read their CSRF and submission state from a request.
+    with current_app.test_request_context(), open(errors_path, 'w') as errors:
+        importer = IMPORTERS[kind](errors)
+        imported = importer.run(read_rows(path, format), chunk_size)
+
+    click.echo(f'Imported {imported} {kind}.')
+    if importer.rejected:
+        click.echo(f'{importer.rejected} rejected rows written to {errors_path}.')
+    else:
+        os.remove(errors_path)
@@ -0,0 +1,387 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from flask import Blueprint, Response, current_app, request
+from sqlalchemy.pool import QueuePool
+
+from cache import response_cache
+from models import db
+from profiling import current_profile, profile_requests
+
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#----------------------------------------------------------------------------#
+# Histograms.
+#----------------------------------------------------------------------------#
+
+# A histogram is a list of per-bucket counts (the last bucket is +Inf)
+# followed by the sum of the observed values.
+
+
+def new_histogram() -> List[float]:
+    return [0] * (len(BUCKETS) + 1) + [0.0]
+
+
+def observe(histogram: List[float], value: float):
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            histogram[i] += 1
+            break
+    else:
+        histogram[len(BUCKETS)] += 1
+    histogram[-1] += value
+
+
+def add_values(target: List[float], source: List[float]):
+    for i, value in enumerate(source):
+        target[i] += value
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that counts checkouts and times how long each one waits."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkout_errors = 0
+        self.checkout_wait = new_histogram()
+        self._metrics_lock = threading.Lock()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            # Pool timeouts, and failures to open a new connection.
+            with self._metrics_lock:
+                self.checkout_errors += 1
+            raise
+        with self._metrics_lock:
+            self.checkouts += 1
+            observe(self.checkout_wait, time.perf_counter() - started)
+        return connection
+
+#----------------------------------------------------------------------------#
+# Aggregation.
+#----------------------------------------------------------------------------#
+
+
+class _Shard:
+    """The counters of one thread. Only that thread writes to them."""
+
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[str, List[float]] = {}
+        self.queries: Dict[str, List[float]] = {}
+        self.templates: Dict[str, List[float]] = {}
+
+
+class Metrics:
+    """
+    Request, database pool and cache metrics in the Prometheus text format.
+
+    Requests record into a per-thread shard without taking any lock; /metrics
+    copies and sums the shards, so scraping never blocks request handling.
+    Metrics are per process; with several workers, set METRICS_DIR so that
+    whichever worker serves /metrics reports the sum over all of them.
+    """
+
+    def __init__(self):
+        self._shards: List[_Shard] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer_pid = None
+
+    def init_app(self, app):
+        # Used for the non-SQLite binds only (routing.pool_options).
+        if not app.config.get('DB_POOL_CLASS'):
+            app.config['DB_POOL_CLASS'] = MeteredQueuePool
+        if app.config.get('METRICS_DIR'):
+            os.makedirs(app.config['METRICS_DIR'], exist_ok=True)
+        profile_requests(app)
+
+        @app.after_request
+        def record_metrics(response):
+            profile = current_profile()
+            if profile is not None:
+                profile.finish()
+                self.record(request.endpoint or 'unmatched', request.method,
+                            response.status_code, profile)
+            if app.config.get('METRICS_DIR') and self._writer_pid != os.getpid():
+                self._start_writer(app)
+            return response
+
+        app.register_blueprint(bp)
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def record(self, route: str, method: str, status: int, profile):
+        shard = self._shard()
+        key = (route, method, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        if route not in shard.latency:
+            shard.latency[route] = new_histogram()
+            shard.queries[route] = [0, 0.0]
+            shard.templates[route] = new_histogram()
+        observe(shard.latency[route], profile.total / 1000)
+        queries = shard.queries[route]
+        queries[0] += profile.sql_count
+        queries[1] += profile.sql_time / 1000
+        if profile.template_time:
+            observe(shard.templates[route], profile.template_time / 1000)
+
+    def write(self, app) -> 'Exposition':
+        """Write the metrics of this process to METRICS_DIR."""
+        with self._write_lock:
+            out = exposition(app, self.collect())
+            write_worker_file(app.config['METRICS_DIR'], out)
+            return out
+
+    def _start_writer(self, app):
+        """
+        Write the metrics of this process every WRITE_INTERVAL seconds from
+        a daemon thread, started by the first request of each worker (the
+        threads of a preloading master do not survive the fork).
+        """
+        with self._write_lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._writer_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(WRITE_INTERVAL)
+                try:
+                    with app.app_context():
+                        self.write(app)
+                except OSError:
+                    # METRICS_DIR removed or full; try again next time.
+                    continue
+
+        threading.Thread(target=run, name='metrics-writer', daemon=True).start()
+
+    def collect(self) -> _Shard:
+        """The sum of all shards."""
+        total = _Shard()
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, count in dict(shard.requests).items():
+                total.requests[key] = total.requests.get(key, 0) + count
+            for name in ('latency', 'queries', 'templates'):
+                merged = getattr(total, name)
+                for route, values in dict(getattr(shard, name)).items():
+                    if route not in merged:
+                        merged[route] = [0] * len(values)
+                    add_values(merged[route], list(values))
+        return total
+
+#----------------------------------------------------------------------------#
+# Exposition.
+#----------------------------------------------------------------------------#
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+Labels = Tuple[Tuple[str, object], ...]
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+class Exposition:
+    """
+    Samples grouped by metric family, each family rendered under its TYPE
+    line. Expositions of several processes merge by adding up their samples.
+    """
+
+    def __init__(self):
+        # name -> (kind, {labels: value}), a histogram's value being its list.
+        self.families: Dict[str, Tuple[str, Dict[Labels, object]]] = {}
+
+    def add(self, name: str, kind: str, value, **labels):
+        self._family(name, kind)[tuple(labels.items())] = value
+
+    def add_histogram(self, name: str, histogram: List[float], **labels):
+        self._family(name, 'histogram')[tuple(labels.items())] = list(histogram)
+
+    def _family(self, name: str, kind: str) -> Dict[Labels, object]:
+        return self.families.setdefault(name, (kind, {}))[1]
+
+    def merge(self, other: 'Exposition', gauges: bool = True):
+        for name, (kind, samples) in other.families.items():
+            if kind == 'gauge' and not gauges:
+                continue
+            family = self._family(name, kind)
+            for labels, value in samples.items():
+                if kind == 'histogram':
+                    if labels not in family:
+                        family[labels] = [0] * len(value)
+                    add_values(family[labels], value)
+                else:
+                    family[labels] = family.get(labels, 0) + value
+
+    def to_json(self) -> str:
+        return json.dumps({name: [kind, [[list(labels), value] for labels, value in samples.items()]]
+                           for name, (kind, samples) in self.families.items()})
+
+    @classmethod
+    def from_json(cls, text: str) -> 'Exposition':
+        out = cls()
+        for name, (kind, samples) in json.loads(text).items():
+            out.families[name] = (kind, {tuple(tuple(pair) for pair in labels): value
+                                         for labels, value in samples})
+        return out
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, samples) in self.families.items():
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples.items():
+                labels = dict(labels)
+                if kind != 'histogram':
+                    lines.append(f'{name}{_labels(**labels) if labels else ""} {value}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+                lines.append(f'{name}_sum{_labels(**labels)} {value[-1]}')
+                lines.append(f'{name}_count{_labels(**labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _add_pool_metrics(out: Exposition, app):
+    for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or {}):
+        pool = db.get_engine(app, bind=bind).pool
+        labels = {'bind': bind or 'primary'}
+        if isinstance(pool, QueuePool):
+            out.add('fyyur_db_pool_size', 'gauge', pool.size(), **labels)
+            out.add('fyyur_db_pool_checked_out', 'gauge', pool.checkedout(), **labels)
+            out.add('fyyur_db_pool_idle', 'gauge', pool.checkedin(), **labels)
+            out.add('fyyur_db_pool_overflow', 'gauge', pool.overflow(), **labels)
+        if isinstance(pool, MeteredQueuePool):
+            with pool._metrics_lock:
+                checkouts, errors = pool.checkouts, pool.checkout_errors
+                wait = list(pool.checkout_wait)
+            out.add('fyyur_db_pool_checkouts_total', 'counter', checkouts, **labels)
+            out.add('fyyur_db_pool_checkout_errors_total', 'counter', errors, **labels)
+            out.add_histogram('fyyur_db_pool_checkout_wait_seconds', wait, **labels)
+
+
+def exposition(app, totals: _Shard) -> Exposition:
+    out = Exposition()
+    for (route, method, status), count in sorted(totals.requests.items()):
+        out.add('fyyur_http_requests_total', 'counter', count,
+                route=route, method=method, status=status)
+    for route, histogram in sorted(totals.latency.items()):
+        out.add_histogram('fyyur_http_request_duration_seconds', histogram, route=route)
+    for route, (count, seconds) in sorted(totals.queries.items()):
+        out.add('fyyur_db_queries_total', 'counter', count, route=route)
+        out.add('fyyur_db_query_seconds_total', 'counter', seconds, route=route)
+    for route, histogram in sorted(totals.templates.items()):
+        if histogram[-1]:
+            out.add_histogram('fyyur_template_render_seconds', histogram, route=route)
+
+    _add_pool_metrics(out, app)
+
+    stats = response_cache.stats()
+    out.add('fyyur_cache_hits_total', 'counter', stats['hits'])
+    out.add('fyyur_cache_misses_total', 'counter', stats['misses'])
+    return out
+
+
+#----------------------------------------------------------------------------#
+# Sharing between workers.
+#----------------------------------------------------------------------------#
+
+# With METRICS_DIR set, each worker process writes its exposition to
+# METRICS_DIR/<pid>.json every WRITE_INTERVAL seconds and whenever it serves
+# /metrics, which then sums the files of every worker. Files of exited
+# workers stay, so their counters never go backwards; their gauges are
+# dropped by mark_process_dead.
+
+WRITE_INTERVAL = 1.0
+
+
+def _worker_path(directory: str, pid: int) -> str:
+    return os.path.join(directory, f'{pid}.json')
+
+
+def write_worker_file(directory: str, out: Exposition):
+    path = _worker_path(directory, os.getpid())
+    with open(path + '.tmp', 'w') as f:
+        f.write(out.to_json())
+    os.replace(path + '.tmp', path)
+
+
+def read_worker_files(directory: str) -> Exposition:
+    total = Exposition()
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                total.merge(Exposition.from_json(f.read()))
+        except (OSError, ValueError):
+            # Removed or being replaced meanwhile.
+            continue
+    return total
+
+
+def mark_process_dead(directory: str, pid: int):
+    """Keep an exited worker's counters but drop its gauges."""
+    path = _worker_path(directory, pid)
+    try:
+        with open(path) as f:
+            out = Exposition.from_json(f.read())
+    except (OSError, ValueError):
+        return
+    kept = Exposition()
+    kept.merge(out, gauges=False)
+    with open(path + '.tmp', 'w') as f:
+        f.write(kept.to_json())
+    os.replace(path + '.tmp', path)
+
+
+def clear_metrics_dir(directory: str):
+    """Remove the files of a previous run, e.g. when the server starts."""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(directory, name))
+
+
+metrics = Metrics()
+
+bp = Blueprint('metrics', __name__)
+
+
+@bp.route('/metrics')
+def metrics_page():
+    """
+    The metrics of every worker with METRICS_DIR set, otherwise those of
+    this process, in the Prometheus text format.
+    """
+    app = current_app._get_current_object()
+    directory = app.config.get('METRICS_DIR')
+    if directory:
+        metrics.write(app)
+        out = read_worker_files(directory)
+    else:
+        out = exposition(app, metrics.collect())
+    return Response(out.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,43 @@
+"""precomputed upcoming show counters on Venue and Artist
+
+Revision ID: 3f6a8d2c9e71
+Revises: b94f0e2c8d15
+Create Date: 2026-10-18 21:12:44.913025
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6a8d2c9e71'
+down_revision = 'b94f0e2c8d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # start_time is naive UTC; CURRENT_TIMESTAMP is the server's local time.
+    now = datetime.utcnow()
+    for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_at', sa.DateTime(), nullable=True))
+        op.create_index(f'ix_{table.lower()}_next_show_at', table, ['next_show_at'], unique=False)
+        op.execute(sa.text(f'''
+            UPDATE "{table}" SET
+                upcoming_show_count = (
+                    SELECT count(*) FROM "Show"
+                    WHERE "Show".{fk} = "{table}".id AND "Show".start_time >= :now),
+                next_show_at = (
+                    SELECT min("Show".start_time) FROM "Show"
+                    WHERE "Show".{fk} = "{table}".id AND "Show".start_time >= :now)
+        ''').bindparams(now=now))
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index(f'ix_{table.lower()}_next_show_at', table_name=table)
+        op.drop_column(table, 'next_show_at')
+        op.drop_column(table, 'upcoming_show_count')
@@ -0,0 +1,26 @@
+"""composite indexes on Show foreign keys and start_time
+
+Revision ID: 5d07e3b1f2a8
+Revises: a3f1c92e7b40
+Create Date: 2026-10-18 19:24:41.530871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d07e3b1f2a8'
+down_revision = 'a3f1c92e7b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='Show')
@@ -0,0 +1,101 @@
+"""move genres into the VenueGenre and ArtistGenre link tables
+
+Revision ID: 7c2e9d4a1b63
+Revises: e81b4c6d0a57
+Create Date: 2026-10-18 20:02:37.662109
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e9d4a1b63'
+down_revision = 'e81b4c6d0a57'
+branch_labels = None
+depends_on = None
+
+
+# Must match search.search_document() exactly, otherwise the planner will not
+# use the index.
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(city, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(state, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(seeking_description, '')), 'C')"
+)
+
+# The previous search document, which still included the genres column.
+OLD_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(genres, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(city, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(state, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(seeking_description, '')), 'C')"
+)
+
+LINK_TABLES = (('Venue', 'VenueGenre', 'venue_id'), ('Artist', 'ArtistGenre', 'artist_id'))
+
+
+def _create_search_index(table, document):
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            f'CREATE INDEX ix_{table.lower()}_search ON "{table}" '
+            f'USING gin (({document}))'
+        )
+
+
+def _drop_search_index(table):
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index(f'ix_{table.lower()}_search', table_name=table)
+
+
+def upgrade():
+    connection = op.get_bind()
+    for table, link_table, fk in LINK_TABLES:
+        link = op.create_table(link_table,
+        sa.Column(fk, sa.Integer(), nullable=False),
+        sa.Column('genre', sa.String(length=50), nullable=False),
+        sa.ForeignKeyConstraint([fk], [f'{table}.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(fk, 'genre')
+        )
+        op.create_index(f'ix_{link_table.lower()}_genre_{fk}', link_table, ['genre', fk], unique=False)
+
+        rows = connection.execute(sa.text(f'SELECT id, genres FROM "{table}"'))
+        links = []
+        for row_id, genres in rows:
+            for genre in dict.fromkeys(json.loads(genres) if genres else []):
+                links.append({fk: row_id, 'genre': genre})
+        if links:
+            op.bulk_insert(link, links)
+
+        _drop_search_index(table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('genres')
+        _create_search_index(table, SEARCH_DOCUMENT)
+
+
+def downgrade():
+    connection = op.get_bind()
+    for table, link_table, fk in LINK_TABLES:
+        length = 120 if table == 'Artist' else None
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.String(length=length), nullable=True))
+
+        genres = {}
+        rows = connection.execute(sa.text(f'SELECT {fk}, genre FROM "{link_table}" ORDER BY genre'))
+        for row_id, genre in rows:
+            genres.setdefault(row_id, []).append(genre)
+        for row_id, values in genres.items():
+            connection.execute(
+                sa.text(f'UPDATE "{table}" SET genres = :genres WHERE id = :id'),
+                {'genres': json.dumps(values), 'id': row_id}
+            )
+
+        _drop_search_index(table)
+        _create_search_index(table, OLD_SEARCH_DOCUMENT)
+
+        op.drop_index(f'ix_{link_table.lower()}_genre_{fk}', table_name=link_table)
+        op.drop_table(link_table)
@@ -0,0 +1,52 @@
+"""show durations and overlap constraints
+
+Revision ID: 8d41b7e6c2f9
+Revises: 3f6a8d2c9e71
+Create Date: 2026-10-18 21:48:05.371902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41b7e6c2f9'
+down_revision = '3f6a8d2c9e71'
+branch_labels = None
+depends_on = None
+
+
+SHOW_PERIOD = "tsrange(start_time, start_time + duration * interval '1 minute')"
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('duration', sa.Integer(), server_default='120', nullable=False))
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    # btree_gist lets the GiST index behind each constraint cover the id too.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for name, column in (('ex_show_venue_overlap', 'venue_id'), ('ex_show_artist_overlap', 'artist_id')):
+        overlaps = bind.execute(sa.text(
+            f'SELECT count(*) FROM "Show" a JOIN "Show" b '
+            f'ON a.{column} = b.{column} AND a.id < b.id '
+            f"AND tsrange(a.start_time, a.start_time + a.duration * interval '1 minute') && "
+            f"tsrange(b.start_time, b.start_time + b.duration * interval '1 minute')"
+        )).scalar()
+        if overlaps:
+            raise RuntimeError(
+                f'{overlaps} pairs of existing shows overlap on {column}; '
+                f'reschedule or shorten them before upgrading.'
+            )
+        op.execute(
+            f'ALTER TABLE "Show" ADD CONSTRAINT {name} '
+            f'EXCLUDE USING gist ({column} WITH =, ({SHOW_PERIOD}) WITH &&)'
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE "Show" DROP CONSTRAINT IF EXISTS ex_show_artist_overlap')
+        op.execute('ALTER TABLE "Show" DROP CONSTRAINT IF EXISTS ex_show_venue_overlap')
+    op.drop_column('Show', 'duration')
@@ -0,0 +1,50 @@
+"""full-text and trigram search indexes
+
+Revision ID: a3f1c92e7b40
+Revises: 4bb5f8a0d6f0
+Create Date: 2026-10-18 19:10:02.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c92e7b40'
+down_revision = '4bb5f8a0d6f0'
+branch_labels = None
+depends_on = None
+
+
+# Must match search.search_document() exactly, otherwise the planner will not
+# use the index.
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(genres, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(city, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(state, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(seeking_description, '')), 'C')"
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.execute(
+            f'CREATE INDEX ix_{table.lower()}_search ON "{table}" '
+            f'USING gin (({SEARCH_DOCUMENT}))'
+        )
+        op.execute(
+            f'CREATE INDEX ix_{table.lower()}_name_trgm ON "{table}" '
+            f'USING gin (name gin_trgm_ops)'
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in ('Venue', 'Artist'):
+        op.drop_index(f'ix_{table.lower()}_name_trgm', table_name=table)
+        op.drop_index(f'ix_{table.lower()}_search', table_name=table)
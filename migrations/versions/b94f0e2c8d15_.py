@@ -0,0 +1,26 @@
+"""version counters on Venue and Artist
+
+Revision ID: b94f0e2c8d15
+Revises: 7c2e9d4a1b63
+Create Date: 2026-10-18 20:31:08.274416
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b94f0e2c8d15'
+down_revision = '7c2e9d4a1b63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Artist', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('Venue', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('Venue', 'version')
+    op.drop_column('Artist', 'version')
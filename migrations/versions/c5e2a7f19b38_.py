@@ -0,0 +1,26 @@
+"""venue coordinates
+
+Revision ID: c5e2a7f19b38
+Revises: 8d41b7e6c2f9
+Create Date: 2026-10-18 22:31:17.520846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e2a7f19b38'
+down_revision = '8d41b7e6c2f9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
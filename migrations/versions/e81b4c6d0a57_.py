@@ -0,0 +1,26 @@
+"""indexes on the keyset pagination sort keys
+
+Revision ID: e81b4c6d0a57
+Revises: 5d07e3b1f2a8
+Create Date: 2026-10-18 19:41:13.004582
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81b4c6d0a57'
+down_revision = '5d07e3b1f2a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+    op.create_index('ix_venue_state_city_id', 'Venue', ['state', 'city', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venue_state_city_id', table_name='Venue')
+    op.drop_index('ix_show_start_time_id', table_name='Show')
@@ -1,24 +1,59 @@
-from datetime import datetime
-from typing import Dict, List
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
-from flask import Flask
-from flask_migrate import Migrate
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+from forms import DEFAULT_SHOW_MINUTES, Genre
+from routing import RoutingSQLAlchemy
+
+# Bound to the app in app.create_app().
+db = RoutingSQLAlchemy()
+moment = Moment()
+
+
+class VenueGenre(db.Model):
+    __tablename__ = 'VenueGenre'
+    __table_args__ = (
+        db.Index('ix_venuegenre_genre_venue_id', 'genre', 'venue_id'),
+    )
+
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'Venue.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(db.String(50), primary_key=True)
+
+
+class ArtistGenre(db.Model):
+    __tablename__ = 'ArtistGenre'
+    __table_args__ = (
+        db.Index('ix_artistgenre_genre_artist_id', 'genre', 'artist_id'),
+    )
+
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'Artist.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(db.String(50), primary_key=True)
+
+
+def _replace_genres(links: List, link_class, genres: List[str]) -> List:
+    """
+    New genre link list for the given genre values. Links for genres that are
+    kept are reused, so an edit never deletes and re-inserts the same row.
+    """
+    genres = [Genre(g).value for g in genres]
+    kept = [link for link in links if link.genre in genres]
+    existing = {link.genre for link in kept}
+    return kept + [link_class(genre=g) for g in dict.fromkeys(genres) if g not in existing]
 
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_venue_state_city_id', 'state', 'city', 'id'),
+        db.Index('ix_venue_next_show_at', 'next_show_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
-    genres = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
@@ -29,31 +64,44 @@ class Venue(db.Model):
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     email = db.Column(db.String(120), nullable=False)
+    # Bumped whenever the venue or its list of shows changes.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Maintained by the flush hooks below and rolled forward by `flask roll-shows`.
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime)
+    # Set by geo.geocode from the city, unless imported with the venue.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
 
     shows = db.relationship('Show', backref='venue',
                             lazy='dynamic', passive_deletes=True)
+    genre_links = db.relationship('VenueGenre', order_by='VenueGenre.genre',
+                                  cascade='all, delete-orphan', passive_deletes=True)
 
-    @staticmethod
-    def _format_shows(shows: List['Show']) -> List[Dict]:
-        return [
-            {
-                "artist_id": show.artist.id,
-                "artist_name": show.artist.name,
-                "artist_image_link": show.artist.image_link,
-                "start_time": str(show.start_time)
-            }
-            for show in shows
-        ]
+    show_fk = 'venue_id'
+    genre_link_class = VenueGenre
 
     @property
-    def past_shows(self) -> List[Dict]:
-        shows = self.shows.filter(Show.start_time < datetime.utcnow()).all()
-        return self._format_shows(shows)
+    def genres(self) -> List[str]:
+        return [link.genre for link in self.genre_links]
 
-    @property
-    def upcoming_shows(self) -> List[Dict]:
-        shows = self.shows.filter(Show.start_time >= datetime.utcnow()).all()
-        return self._format_shows(shows)
+    @genres.setter
+    def genres(self, genres: List[str]):
+        self.genre_links = _replace_genres(self.genre_links, VenueGenre, genres)
+
+    def past_and_upcoming_shows(self) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Load every show at this venue together with its artist in one query
+        and split them into past and upcoming shows. Shows without a start
+        time are in neither.
+        """
+        shows = (
+            db.session.query(Show.start_time, Artist.id, Artist.name, Artist.image_link)
+            .join(Artist, Show.artist_id == Artist.id)
+            .filter(Show.venue_id == self.id, Show.start_time.isnot(None))
+            .order_by(Show.start_time)
+        )
+        return _split_shows(shows, ('artist_id', 'artist_name', 'artist_image_link'))
 
     def __repr__(self):
         return (
@@ -70,44 +118,56 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_artist_next_show_at', 'next_show_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String)
     website = db.Column(db.String(120))
     email = db.Column(db.String(120), nullable=False)
+    # Bumped whenever the artist or their list of shows changes.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Maintained by the flush hooks below and rolled forward by `flask roll-shows`.
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime)
 
     shows = db.relationship('Show', backref='artist', lazy='dynamic',
                             cascade='all, delete-orphan', passive_deletes=True)
+    genre_links = db.relationship('ArtistGenre', order_by='ArtistGenre.genre',
+                                  cascade='all, delete-orphan', passive_deletes=True)
 
-    @staticmethod
-    def _format_shows(shows: List['Show']) -> List[Dict]:
-        return [
-            {
-                "venue_id": show.venue.id,
-                "venue_name": show.venue.name,
-                "venue_image_link": show.venue.image_link,
-                "start_time": str(show.start_time)
-            }
-            for show in shows
-        ]
+    show_fk = 'artist_id'
+    genre_link_class = ArtistGenre
 
     @property
-    def past_shows(self) -> List[Dict]:
-        shows = self.shows.filter(Show.start_time < datetime.utcnow())
-        return self._format_shows(shows)
+    def genres(self) -> List[str]:
+        return [link.genre for link in self.genre_links]
 
-    @property
-    def upcoming_shows(self) -> List[Dict]:
-        shows = self.shows.filter(Show.start_time >= datetime.utcnow())
-        return self._format_shows(shows)
+    @genres.setter
+    def genres(self, genres: List[str]):
+        self.genre_links = _replace_genres(self.genre_links, ArtistGenre, genres)
+
+    def past_and_upcoming_shows(self) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Load every show by this artist together with its venue in one query
+        and split them into past and upcoming shows. Shows without a start
+        time are in neither.
+        """
+        shows = (
+            db.session.query(Show.start_time, Venue.id, Venue.name, Venue.image_link)
+            .join(Venue, Show.venue_id == Venue.id)
+            .filter(Show.artist_id == self.id, Show.start_time.isnot(None))
+            .order_by(Show.start_time)
+        )
+        return _split_shows(shows, ('venue_id', 'venue_name', 'venue_image_link'))
 
     def __repr__(self):
         return (
@@ -124,6 +184,11 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey(
@@ -131,6 +196,14 @@ class Show(db.Model):
     venue_id = db.Column(db.Integer, db.ForeignKey(
         'Venue.id', ondelete='CASCADE'))
     start_time = db.Column(db.DateTime)
+    # In minutes. On Postgres, exclusion constraints reject overlapping shows
+    # at the same venue or by the same artist.
+    duration = db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES,
+                         server_default=str(DEFAULT_SHOW_MINUTES))
+
+    @property
+    def end_time(self) -> datetime:
+        return self.start_time + timedelta(minutes=self.duration or DEFAULT_SHOW_MINUTES)
 
     def __repr__(self):
         return (
@@ -143,4 +216,240 @@ class Show(db.Model):
         )
 
 
-db.create_all()
+# Columns of a venue or artist shown on the detail pages of the other side.
+LINKED_ATTRIBUTES = ('name', 'image_link')
+
+
+@event.listens_for(db.session, 'before_flush')
+def _bump_versions(session, flush_context, instances):
+    """
+    Bump the version of every modified venue and artist, and of the venue and
+    artist of every show being added or removed. A rename or new image also
+    bumps every venue or artist it has shows with, whose detail pages list it.
+    """
+    for obj in session.dirty:
+        if isinstance(obj, (Venue, Artist)) and session.is_modified(obj):
+            # Incremented in the UPDATE itself, so concurrent edits each
+            # get their own version.
+            obj.version = type(obj).version + 1
+            state = inspect(obj)
+            if any(state.attrs[key].history.has_changes() for key in LINKED_ATTRIBUTES):
+                model, fk = _counterparts(obj.show_fk)
+                table = model.__table__
+                session.execute(
+                    table.update()
+                    .where(table.c.id.in_(
+                        db.session.query(fk).filter(getattr(Show, obj.show_fk) == obj.id)))
+                    .values(version=table.c.version + 1)
+                    .execution_options(synchronize_session=False)
+                )
+
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Show):
+            for model, entity_id in ((Venue, obj.venue_id), (Artist, obj.artist_id)):
+                if entity_id is not None:
+                    table = model.__table__
+                    session.execute(
+                        table.update()
+                        .where(table.c.id == entity_id)
+                        .values(version=table.c.version + 1)
+                    )
+
+
+#----------------------------------------------------------------------------#
+# Upcoming show counters.
+#----------------------------------------------------------------------------#
+
+# upcoming_show_count and next_show_at count the shows starting at or after
+# the last roll (see roll_show_counters). Between rolls a show that has
+# started is still counted, and it is always the one at next_show_at, so a
+# show is counted exactly when it starts at or after next_show_at.
+
+# Venues and artists whose upcoming shows are removed by a database cascade
+# and whose counters are therefore recomputed after the flush.
+CASCADED_KEY = 'show_counters_cascaded'
+
+
+def _counterparts(show_fk: str):
+    return (Artist, Show.artist_id) if show_fk == 'venue_id' else (Venue, Show.venue_id)
+
+
+def _upcoming_shows(model, aggregate, since):
+    return (
+        db.session.query(aggregate)
+        .filter(getattr(Show, model.show_fk) == model.id, Show.start_time >= since)
+        .correlate(model)
+        .as_scalar()
+    )
+
+
+def refresh_show_counters(session, model, ids):
+    """Recompute the counters of the given venues or artists from their shows."""
+    if not ids:
+        return
+    now = datetime.utcnow()
+    table = model.__table__
+    session.execute(
+        table.update()
+        .where(table.c.id.in_(list(ids)))
+        .values(upcoming_show_count=_upcoming_shows(model, db.func.count(Show.id), now),
+                next_show_at=_upcoming_shows(model, db.func.min(Show.start_time), now))
+    )
+
+
+def roll_show_counters(session) -> int:
+    """
+    Move shows that have started from upcoming to past, by recomputing the
+    counters of every venue and artist whose next show is no longer upcoming.
+    Returns the number of venues and artists updated.
+    """
+    now = datetime.utcnow()
+    rolled = 0
+    for model in (Venue, Artist):
+        ids = [row[0] for row in session.query(model.id).filter(model.next_show_at < now)]
+        refresh_show_counters(session, model, ids)
+        rolled += len(ids)
+    return rolled
+
+
+def _add_show(session, model, entity_id, start_time):
+    table = model.__table__
+    session.execute(
+        table.update()
+        .where(table.c.id == entity_id)
+        .values(
+            upcoming_show_count=table.c.upcoming_show_count + 1,
+            next_show_at=db.case(
+                [(db.or_(table.c.next_show_at.is_(None), table.c.next_show_at > start_time),
+                  start_time)],
+                else_=table.c.next_show_at,
+            ),
+        )
+    )
+
+
+def _remove_show(session, model, entity_id, start_time):
+    table = model.__table__
+    session.execute(
+        table.update()
+        .where(table.c.id == entity_id, table.c.next_show_at <= start_time)
+        .values(
+            upcoming_show_count=table.c.upcoming_show_count - 1,
+            next_show_at=db.case(
+                [(table.c.next_show_at == start_time,
+                  _upcoming_shows(model, db.func.min(Show.start_time), start_time))],
+                else_=table.c.next_show_at,
+            ),
+        )
+    )
+
+
+@event.listens_for(db.session, 'before_flush')
+def _find_cascaded_counters(session, flush_context, instances):
+    """
+    Deleting a venue or artist deletes its shows in the database, so note the
+    other side of each of its upcoming shows while they can still be read.
+    """
+    cascaded = session.info.setdefault(CASCADED_KEY, [])
+    now = datetime.utcnow()
+    for obj in session.deleted:
+        if isinstance(obj, (Venue, Artist)):
+            model, fk = _counterparts(obj.show_fk)
+            ids = (
+                session.query(fk).distinct()
+                .filter(getattr(Show, obj.show_fk) == obj.id, Show.start_time >= now)
+            )
+            cascaded.append((model, {row[0] for row in ids}))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _update_show_counters(session, flush_context):
+    """Apply the shows added and removed by this flush to the counters."""
+    now = datetime.utcnow()
+    for obj in session.new:
+        if isinstance(obj, Show):
+            for model, entity_id in ((Venue, obj.venue_id), (Artist, obj.artist_id)):
+                if not isinstance(obj.start_time, datetime):
+                    # Not yet converted by the database; read it back.
+                    refresh_show_counters(session, model, [entity_id])
+                elif obj.start_time >= now:
+                    _add_show(session, model, entity_id, obj.start_time)
+
+    for obj in session.deleted:
+        if isinstance(obj, Show) and isinstance(obj.start_time, datetime):
+            for model, entity_id in ((Venue, obj.venue_id), (Artist, obj.artist_id)):
+                _remove_show(session, model, entity_id, obj.start_time)
+
+    for model, ids in session.info.pop(CASCADED_KEY, []):
+        refresh_show_counters(session, model, ids)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_cascaded_counters(session):
+    session.info.pop(CASCADED_KEY, None)
+
+#----------------------------------------------------------------------------#
+# Query helpers.
+#----------------------------------------------------------------------------#
+
+
+def _split_shows(rows, keys: Tuple[str, str, str]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Format (start_time, id, name, image_link) rows and partition them against
+    a single timestamp, so a show can't land in both lists or neither.
+    """
+    now = datetime.utcnow()
+    past_shows, upcoming_shows = [], []
+    for start_time, *counterpart in rows:
+        show = dict(zip(keys, counterpart))
+        show["start_time"] = start_time
+        (past_shows if start_time < now else upcoming_shows).append(show)
+    return past_shows, upcoming_shows
+
+
+def with_genre(model, genre: str, column=None):
+    """
+    Criterion matching rows of `model` (Venue or Artist) tagged with `genre`,
+    or with `column`, rows referencing such a venue or artist.
+    """
+    link = model.genre_link_class
+    fk = getattr(link, model.show_fk)
+    column = model.id if column is None else column
+    return column.in_(db.session.query(fk).filter(link.genre == genre))
+
+
+def genre_list(model):
+    """Comma separated genres of each row of `model`, as a correlated subquery."""
+    link = model.genre_link_class
+    if db.session.get_bind().dialect.name == 'postgresql':
+        aggregate = db.func.string_agg(link.genre, db.literal(','))
+    else:
+        aggregate = db.func.group_concat(link.genre, db.literal(','))
+    return (
+        db.session.query(aggregate)
+        .filter(getattr(link, model.show_fk) == model.id)
+        .correlate(model)
+        .as_scalar()
+        .label('genres')
+    )
+
+
+def with_upcoming_show_count(model, *criteria, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Load id, name and number of upcoming shows for the rows of `model`
+    (Venue or Artist) matching the criteria, at most `limit` of them. The
+    count is read from the precomputed upcoming_show_count column.
+    """
+    query = (
+        model.query
+        .filter(*criteria)
+        .with_entities(model.id, model.name, model.upcoming_show_count)
+        .order_by(model.id)
+        .limit(limit)
+    )
+
+    return [
+        {"id": r[0], "name": r[1], "num_upcoming_shows": r[2]}
+        for r in query
+    ]
+
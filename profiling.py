@@ -0,0 +1,225 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from flask import (Blueprint, abort, before_render_template, current_app, g,
+                   has_request_context, render_template, request,
+                   template_rendered)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request profile.
+#----------------------------------------------------------------------------#
+
+
+class RequestProfile:
+    """SQL, template and total timings of one request, in milliseconds."""
+
+    def __init__(self, max_statements: int):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements: List = []
+        self.max_statements = max_statements
+        self._templates: List[float] = []
+
+    def add_statement(self, statement: str, duration: float):
+        self.sql_count += 1
+        self.sql_time += duration
+        if len(self.statements) < self.max_statements:
+            self.statements.append((round(duration, 2), statement))
+
+    def template_started(self):
+        self._templates.append(time.perf_counter())
+
+    def template_finished(self):
+        if self._templates:
+            started = self._templates.pop()
+            # Nested renders are already part of the outer one.
+            if not self._templates:
+                self.template_time += (time.perf_counter() - started) * 1000
+
+    def finish(self):
+        if not self.total:
+            self.total = (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        return (
+            f'sql;dur={self.sql_time:.2f};desc="{self.sql_count} queries", '
+            f'template;dur={self.template_time:.2f}, '
+            f'total;dur={self.total:.2f}'
+        )
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return g.get('profile') if has_request_context() else None
+
+
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    if current_profile() is not None:
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile()
+    started = conn.info.get('profile_started')
+    if profile is not None and started:
+        profile.add_statement(statement, (time.perf_counter() - started.pop()) * 1000)
+
+
+def _statement_failed(context):
+    # after_cursor_execute doesn't run for a statement that raises.
+    if context.connection is not None:
+        started = context.connection.info.get('profile_started')
+        if started:
+            started.pop()
+
+
+def _template_started(sender, template, context, **extra):
+    profile = current_profile()
+    if profile is not None:
+        profile.template_started()
+
+
+def _template_finished(sender, template, context, **extra):
+    profile = current_profile()
+    if profile is not None:
+        profile.template_finished()
+
+
+def profile_requests(app):
+    """
+    Attach a RequestProfile to every request of `app`, for the profiler and
+    the metrics to read in their after_request hooks. Statements are only
+    kept when the profiler is enabled. The statement timers are only
+    installed here, so apps without profiling or metrics pay nothing per
+    query.
+    """
+    if 'request_profile' in app.extensions:
+        return
+    app.extensions['request_profile'] = True
+    if not event.contains(Engine, 'before_cursor_execute', _statement_started):
+        event.listen(Engine, 'before_cursor_execute', _statement_started)
+        event.listen(Engine, 'after_cursor_execute', _statement_finished)
+        event.listen(Engine, 'handle_error', _statement_failed)
+    max_statements = 0
+    if app.config.get('PROFILING_ENABLED'):
+        max_statements = app.config.get('PROFILING_MAX_STATEMENTS', 100)
+
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+    @app.before_request
+    def start_profile():
+        g.profile = RequestProfile(max_statements)
+
+#----------------------------------------------------------------------------#
+# Aggregation.
+#----------------------------------------------------------------------------#
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class Profiler:
+    """
+    Opt-in request profiling, enabled with PROFILING_ENABLED.
+
+    Every request gets a Server-Timing header with its SQL, template and
+    total time. The last PROFILING_SAMPLES latencies of each route are kept
+    for percentiles, and requests slower than PROFILING_SLOW_MS are logged
+    with their statements and kept in a rolling slow log. /_profiler, in
+    debug mode only, ranks the routes of this process by p95.
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, deque] = {}
+        self.slow_log: deque = deque(maxlen=100)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        config = app.config
+        samples = config.get('PROFILING_SAMPLES', 1000)
+        slow_ms = config.get('PROFILING_SLOW_MS', 500)
+        self.slow_log = deque(maxlen=config.get('PROFILING_SLOW_LOG_SIZE', 100))
+        profile_requests(app)
+
+        @app.after_request
+        def finish_profile(response):
+            profile = current_profile()
+            if profile is None:
+                return response
+            profile.finish()
+            response.headers['Server-Timing'] = profile.server_timing()
+            self.record(request.endpoint or 'unmatched', profile, samples, slow_ms)
+            return response
+
+        app.register_blueprint(bp)
+
+    def record(self, route: str, profile: RequestProfile, samples: int, slow_ms: float):
+        latencies = self.samples.get(route)
+        if latencies is None:
+            with self._lock:
+                latencies = self.samples.setdefault(route, deque(maxlen=samples))
+        latencies.append((profile.total, profile.sql_count, profile.sql_time))
+
+        if profile.total >= slow_ms:
+            entry = {
+                'route': route,
+                'path': request.full_path,
+                'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'total': round(profile.total, 2),
+                'sql_count': profile.sql_count,
+                'sql_time': round(profile.sql_time, 2),
+                'template_time': round(profile.template_time, 2),
+                'statements': profile.statements,
+            }
+            self.slow_log.appendleft(entry)
+            current_app.logger.warning(
+                f'Slow request {entry["path"]}: {entry["total"]}ms, '
+                f'{entry["sql_count"]} queries in {entry["sql_time"]}ms'
+            )
+
+    def route_stats(self) -> List[Dict]:
+        """Latency percentiles and average SQL use per route, slowest p95 first."""
+        stats = []
+        for route, latencies in list(self.samples.items()):
+            samples = list(latencies)
+            if not samples:
+                continue
+            totals = sorted(s[0] for s in samples)
+            stats.append({
+                'route': route,
+                'requests': len(samples),
+                'p50': round(percentile(totals, 0.50), 2),
+                'p95': round(percentile(totals, 0.95), 2),
+                'max': round(totals[-1], 2),
+                'avg_sql_count': round(sum(s[1] for s in samples) / len(samples), 1),
+                'avg_sql_time': round(sum(s[2] for s in samples) / len(samples), 2),
+            })
+        return sorted(stats, key=lambda s: s['p95'], reverse=True)
+
+
+profiler = Profiler()
+
+bp = Blueprint('profiler', __name__)
+
+
+@bp.route('/_profiler')
+def profiler_page():
+    """
+    Routes ranked by p95 latency, and the slow request log. The log shows
+    raw SQL, so the page is only served in debug mode.
+    """
+    if not current_app.debug:
+        abort(404)
+    return render_template('pages/profiler.html', routes=profiler.route_stats(),
+                           slow_log=list(profiler.slow_log))
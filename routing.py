@@ -0,0 +1,107 @@
+import random
+import time
+from functools import wraps
+
+from flask import g, has_request_context
+from flask import session as http_session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event, orm
+from sqlalchemy.engine import make_url
+
+# Set on the database session once it has written; every later statement in
+# the same request then reads its own writes from the primary.
+PRIMARY_KEY = 'use_primary'
+# Flask session key holding the time until which this client reads from the
+# primary, so the page it is redirected to after a write isn't served from a
+# replica that hasn't caught up yet.
+STICKY_KEY = '_primary_until'
+
+
+def read_only(view):
+    """Mark a view as read-only, allowing its queries to go to a replica."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def pool_options(config, url) -> dict:
+    """Pool sizing for an engine on `url`; SQLite's pools don't take sizes."""
+    if make_url(url).get_backend_name() == 'sqlite':
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+    }
+
+
+class RoutingSession(SignallingSession):
+    """
+    Sends the queries of read-only views to one of the replicas (picked once
+    per request) and everything else, including all flushes, to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = self._replica_bind()
+        if replica is not None:
+            return get_state(self.app).db.get_engine(self.app, bind=replica)
+        return super().get_bind(mapper, clause)
+
+    def _replica_bind(self):
+        if self._flushing or self.info.get(PRIMARY_KEY) or not has_request_context():
+            return None
+        if not g.get('read_only') or http_session.get(STICKY_KEY, 0) > time.time():
+            return None
+        if 'replica_bind' not in g:
+            replicas = get_state(self.app).db.replica_binds(self.app)
+            g.replica_bind = random.choice(replicas) if replicas else None
+        return g.replica_bind
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _stick_to_primary(session, flush_context):
+    session.info[PRIMARY_KEY] = True
+    if has_request_context():
+        g.wrote_to_primary = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy with read replicas. SQLALCHEMY_REPLICA_URIS are
+    registered as the binds replica_0, replica_1, ... and used by
+    RoutingSession.
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        for i, uri in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or ()):
+            binds[f'replica_{i}'] = uri
+        app.config['SQLALCHEMY_BINDS'] = binds
+        super().init_app(app)
+
+        @app.after_request
+        def stick_to_primary(response):
+            seconds = app.config.get('REPLICA_STICKY_SECONDS')
+            if g.get('wrote_to_primary') and seconds:
+                http_session[STICKY_KEY] = time.time() + seconds
+            return response
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        # Called for every bind with its final URL, so a SQLite bind or
+        # primary gets no pool sizes whatever the others use.
+        sa_url, options = super().apply_driver_hacks(app, sa_url, options)
+        extra = pool_options(app.config, sa_url)
+        if extra and app.config.get('DB_POOL_CLASS'):
+            extra['poolclass'] = app.config['DB_POOL_CLASS']
+        options.update(extra)
+        return sa_url, options
+
+    def replica_binds(self, app):
+        return [key for key in app.config['SQLALCHEMY_BINDS'] if key.startswith('replica_')]
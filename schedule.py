@@ -0,0 +1,104 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from itertools import count
+from typing import Dict, Hashable, List, NamedTuple, Sequence
+
+from forms import DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
+from models import Show, db
+
+MAX_DURATION = timedelta(minutes=MAX_SHOW_MINUTES)
+
+# Constraint names from the migration, reported by Postgres on a conflict.
+OVERLAP_CONSTRAINTS = ('ex_show_venue_overlap', 'ex_show_artist_overlap')
+
+
+class Slot(NamedTuple):
+    """A proposed show."""
+    venue_id: int
+    artist_id: int
+    start_time: datetime
+    duration: int = DEFAULT_SHOW_MINUTES
+
+    @property
+    def end_time(self) -> datetime:
+        return self.start_time + timedelta(minutes=self.duration)
+
+
+class IntervalIndex:
+    """
+    Half-open [start, end) intervals per key (a venue or an artist), sorted by
+    start. No interval is longer than max_length, so every interval that
+    overlaps [start, end) starts within (start - max_length, end), and one
+    bisect per lookup finds the candidates.
+    """
+
+    def __init__(self, max_length: timedelta = MAX_DURATION):
+        self.max_length = max_length
+        self._intervals: Dict[Hashable, List] = {}
+        # Breaks ties between equal intervals, so values are never compared.
+        self._sequence = count()
+
+    def add(self, key: Hashable, start: datetime, end: datetime, value):
+        insort(self._intervals.setdefault(key, []), (start, end, next(self._sequence), value))
+
+    def overlapping(self, key: Hashable, start: datetime, end: datetime) -> List:
+        """Values of the intervals under `key` that overlap [start, end)."""
+        intervals = self._intervals.get(key)
+        if not intervals:
+            return []
+        lo = bisect_right(intervals, (start - self.max_length, datetime.max))
+        # (end,) sorts before every interval starting at end.
+        hi = bisect_left(intervals, (end,))
+        return [value for _, e, _, value in intervals[lo:hi] if e > start]
+
+
+def load_bookings(index: IntervalIndex, slots: Sequence[Slot]):
+    """
+    Add the existing shows that could overlap any of the slots to the index,
+    under ('venue', id) and ('artist', id). One range query per side, on the
+    (venue_id, start_time) and (artist_id, start_time) indexes.
+    """
+    since = min(s.start_time for s in slots) - MAX_DURATION
+    until = max(s.end_time for s in slots)
+    for kind, column in (('venue', Show.venue_id), ('artist', Show.artist_id)):
+        ids = {getattr(s, f'{kind}_id') for s in slots}
+        shows = (
+            db.session.query(Show.id, column, Show.start_time, Show.duration)
+            .filter(column.in_(ids), Show.start_time > since, Show.start_time < until)
+        )
+        for show_id, entity_id, start_time, duration in shows:
+            end_time = start_time + timedelta(minutes=duration)
+            index.add((kind, entity_id), start_time, end_time,
+                      {'show_id': show_id, 'start_time': start_time, 'end_time': end_time})
+
+
+def find_conflicts(slots: Sequence[Slot]) -> List[List[Dict]]:
+    """
+    Conflicts of each slot, with existing shows and with the slots before it
+    in the list, as if they were booked in order. An empty list means the
+    slot is free.
+    """
+    if not slots:
+        return []
+    index = IntervalIndex()
+    load_bookings(index, slots)
+
+    results = []
+    for i, slot in enumerate(slots):
+        conflicts = []
+        for kind in ('venue', 'artist'):
+            key = (kind, getattr(slot, f'{kind}_id'))
+            for booking in index.overlapping(key, slot.start_time, slot.end_time):
+                conflicts.append(dict(booking, kind=kind))
+        results.append(conflicts)
+        if not conflicts:
+            booking = {'slot': i, 'start_time': slot.start_time, 'end_time': slot.end_time}
+            index.add(('venue', slot.venue_id), slot.start_time, slot.end_time, booking)
+            index.add(('artist', slot.artist_id), slot.start_time, slot.end_time, booking)
+    return results
+
+
+def is_overlap_error(error) -> bool:
+    """Whether a database error is a Postgres overlap constraint violation."""
+    diag = getattr(getattr(error, 'orig', None), 'diag', None)
+    return getattr(diag, 'constraint_name', None) in OVERLAP_CONSTRAINTS
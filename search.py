@@ -0,0 +1,554 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import case, event, func
+from sqlalchemy.orm import Session
+
+from forms import Genre
+from models import Artist, Venue, db, with_upcoming_show_count
+
+#----------------------------------------------------------------------------#
+# Searchable fields.
+#----------------------------------------------------------------------------#
+
+# Column name -> relevance weight. The Postgres letters map onto the default
+# ts_rank weights {D: 0.1, C: 0.2, B: 0.4, A: 1.0}.
+SEARCH_FIELDS = (
+    ('name', 'A', 1.0),
+    ('city', 'B', 0.4),
+    ('state', 'B', 0.4),
+    ('seeking_description', 'C', 0.2),
+)
+
+# Genres live in the genre link tables rather than on the row, so they are
+# matched separately and weighted like a 'B' field.
+GENRE_WEIGHT = 0.4
+
+SEARCH_LIMIT = 100
+
+# Minimum trigram similarity for a fuzzy match, same as pg_trgm's default.
+TRIGRAM_THRESHOLD = 0.3
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Autocomplete keys: one per word of a name, for its first few words, each
+# cut to a bounded length.
+AUTOCOMPLETE_WORDS = 4
+AUTOCOMPLETE_KEY_LENGTH = 40
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def trigrams(word: str) -> Set[str]:
+    """Trigrams of a single word, padded the same way pg_trgm does it."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def matching_genres(search_term: str) -> List[str]:
+    """Genres having a word starting with each token of the search term."""
+    tokens = tokenize(search_term)
+    return [
+        g.value for g in Genre
+        if tokens and all(
+            any(word.startswith(t) for word in tokenize(g.value)) for t in tokens
+        )
+    ]
+
+#----------------------------------------------------------------------------#
+# In-memory index.
+#----------------------------------------------------------------------------#
+
+
+class InMemorySearchIndex:
+    """
+    Inverted index with prefix lookups and a trigram index over the vocabulary
+    for fuzzy matching. Used when the database is not PostgreSQL (e.g. SQLite
+    in development and tests).
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._vocabulary: List[str] = []
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self._documents: Dict[int, Dict[str, float]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, doc_id: int, fields: Dict):
+        """
+        Index (or re-index) a document given its column values and its list
+        of genres under 'genres'.
+        """
+        weighted = [(fields.get(field), weight) for field, _, weight in SEARCH_FIELDS]
+        weighted.append((' '.join(fields.get('genres') or ()), GENRE_WEIGHT))
+
+        terms: Dict[str, float] = {}
+        for text, weight in weighted:
+            for token in tokenize(text):
+                terms[token] = max(terms.get(token, 0), weight)
+
+        with self._lock:
+            self.remove(doc_id)
+            self._documents[doc_id] = terms
+            for term, weight in terms.items():
+                if term not in self._postings:
+                    bisect.insort(self._vocabulary, term)
+                    for trigram in trigrams(term):
+                        self._trigrams[trigram].add(term)
+                self._postings[term][doc_id] = weight
+
+    def remove(self, doc_id: int):
+        with self._lock:
+            for term in self._documents.pop(doc_id, {}):
+                postings = self._postings[term]
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, term)]
+                    for trigram in trigrams(term):
+                        self._trigrams[trigram].discard(term)
+
+    def _prefix_terms(self, prefix: str) -> Iterable[str]:
+        i = bisect.bisect_left(self._vocabulary, prefix)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(prefix):
+            yield self._vocabulary[i]
+            i += 1
+
+    def _similar_terms(self, token: str) -> Dict[str, float]:
+        query_trigrams = trigrams(token)
+        shared: Dict[str, int] = defaultdict(int)
+        for trigram in query_trigrams:
+            for term in self._trigrams.get(trigram, ()):
+                shared[term] += 1
+        similar = {}
+        for term, common in shared.items():
+            similarity = common / (len(query_trigrams) + len(trigrams(term)) - common)
+            if similarity >= TRIGRAM_THRESHOLD:
+                similar[term] = similarity
+        return similar
+
+    def search(self, search_term: str, limit: int = SEARCH_LIMIT) -> List[Tuple[int, float]]:
+        """
+        Rank documents matching every token of the search term as a prefix.
+        Falls back to trigram similarity when nothing matches exactly.
+        """
+        ranked = sorted(self.scores(search_term).items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+    def scores(self, search_term: str) -> Dict[int, float]:
+        """The score of every document matching the search term, unordered."""
+        tokens = tokenize(search_term)
+        if not tokens:
+            return {}
+
+        with self._lock:
+            scores = None
+            for token in tokens:
+                token_scores: Dict[int, float] = {}
+                for term in self._prefix_terms(token):
+                    # Whole-word matches outrank prefix matches.
+                    boost = 1.0 if term == token else 0.5
+                    for doc_id, weight in self._postings[term].items():
+                        token_scores[doc_id] = max(token_scores.get(doc_id, 0), weight * boost)
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {d: scores[d] + s for d, s in token_scores.items() if d in scores}
+
+            if not scores:
+                scores = defaultdict(float)
+                for token in tokens:
+                    for term, similarity in self._similar_terms(token).items():
+                        for doc_id, weight in self._postings[term].items():
+                            scores[doc_id] += similarity * weight
+        return dict(scores)
+
+#----------------------------------------------------------------------------#
+# PostgreSQL backend.
+#----------------------------------------------------------------------------#
+
+
+def search_document(model):
+    """
+    Weighted tsvector over the searchable fields. Must stay identical to the
+    expression of the ix_<table>_search GIN index so the planner can use it.
+    """
+    document = None
+    for field, letter, _ in SEARCH_FIELDS:
+        vector = func.setweight(
+            func.to_tsvector('simple', func.coalesce(getattr(model, field), '')),
+            letter
+        )
+        document = vector if document is None else document.op('||')(vector)
+    return document
+
+
+def prefix_tsquery(search_term: str) -> str:
+    return ' & '.join(f'{token}:*' for token in tokenize(search_term))
+
+
+class PostgresSearchBackend:
+    """Full-text search on the GIN tsvector index with a pg_trgm fallback."""
+
+    def search(self, model, search_term: str, limit: int = SEARCH_LIMIT) -> Tuple[List[Tuple[int, float]], int]:
+        query = prefix_tsquery(search_term)
+        if not query:
+            return [], 0
+
+        tsquery = func.to_tsquery('simple', query)
+        document = search_document(model)
+        rank = func.ts_rank(document, tsquery)
+
+        # The text and genre matches are looked up separately, on the GIN
+        # index and the genre link index, and UNIONed: ORing them in one
+        # WHERE clause would scan the whole table.
+        candidates = db.session.query(model.id.label('id')).filter(document.op('@@')(tsquery))
+        genres = matching_genres(search_term)
+        if genres:
+            link = model.genre_link_class
+            in_genres = (
+                db.session.query(getattr(link, model.show_fk))
+                .filter(link.genre.in_(genres))
+            )
+            candidates = candidates.union(in_genres)
+            rank = rank + case([(model.id.in_(in_genres), GENRE_WEIGHT)], else_=0)
+        candidates = candidates.subquery()
+
+        # The total is counted over all matches, in the same statement.
+        total = func.count().over()
+        ranked = (
+            db.session.query(model.id, rank, total)
+            .join(candidates, candidates.c.id == model.id)
+            .order_by(rank.desc(), model.id)
+            .limit(limit)
+            .all()
+        )
+        if not ranked:
+            similarity = func.similarity(model.name, search_term)
+            ranked = (
+                db.session.query(model.id, similarity, total)
+                .filter(model.name.op('%')(search_term))
+                .order_by(similarity.desc(), model.id)
+                .limit(limit)
+                .all()
+            )
+        return [(doc_id, score) for doc_id, score, _ in ranked], ranked[0][2] if ranked else 0
+
+
+class InMemorySearchBackend:
+    """
+    One lazily built InMemorySearchIndex per model. Commits in this process
+    are applied to it as they happen (see _apply_pending); it is rebuilt
+    every SEARCH_INDEX_TTL seconds to pick up writes made by other workers.
+    """
+
+    def __init__(self):
+        self._indexes: Dict[type, Tuple[InMemorySearchIndex, float]] = {}
+        self._lock = threading.Lock()
+
+    def index_for(self, model) -> InMemorySearchIndex:
+        ttl = current_app.config.get('SEARCH_INDEX_TTL', 300)
+        entry = self._indexes.get(model)
+        if entry is None or time.monotonic() - entry[1] > ttl:
+            with self._lock:
+                entry = self._indexes.get(model)
+                if entry is None or time.monotonic() - entry[1] > ttl:
+                    entry = self._indexes[model] = (self._build(model), time.monotonic())
+        return entry[0]
+
+    def _build(self, model) -> InMemorySearchIndex:
+        index = InMemorySearchIndex()
+        link = model.genre_link_class
+        genres = defaultdict(list)
+        for doc_id, genre in db.session.query(getattr(link, model.show_fk), link.genre):
+            genres[doc_id].append(genre)
+
+        fields = [field for field, _, _ in SEARCH_FIELDS]
+        columns = [getattr(model, field) for field in fields]
+        for row in db.session.query(model.id, *columns):
+            document = dict(zip(fields, row[1:]), genres=genres[row[0]])
+            index.add(row[0], document)
+        return index
+
+    def apply(self, model, doc_id: int, fields: Dict):
+        """Keep an already built index in step with a committed write."""
+        entry = self._indexes.get(model)
+        if entry is not None:
+            if fields is None:
+                entry[0].remove(doc_id)
+            else:
+                entry[0].add(doc_id, fields)
+
+    def reset(self):
+        self._indexes.clear()
+
+    def search(self, model, search_term: str, limit: int = SEARCH_LIMIT) -> Tuple[List[Tuple[int, float]], int]:
+        scores = self.index_for(model).scores(search_term)
+        ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked, len(scores)
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+
+def prefix_key(text: str) -> str:
+    return ' '.join(tokenize(text))[:AUTOCOMPLETE_KEY_LENGTH]
+
+
+def name_keys(name: str) -> List[str]:
+    """'The Blue Room' -> ['the blue room', 'blue room', 'room']."""
+    tokens = tokenize(name)
+    return list(dict.fromkeys(
+        ' '.join(tokens[i:])[:AUTOCOMPLETE_KEY_LENGTH]
+        for i in range(min(len(tokens), AUTOCOMPLETE_WORDS))
+    ))
+
+
+class PrefixIndex:
+    """
+    Sorted array of (key, kind, id) for completing venue and artist names.
+    Each name is filed under every word it contains (see name_keys), so a
+    prefix matches the start of any word, and a lookup is one bisect plus a
+    scan of the matching keys.
+
+    Memory is bounded: the index holds at most max_entries keys, and names
+    that don't fit are left out (`full` is set) until it is rebuilt.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.full = False
+        self._keys: List[Tuple[str, str, int]] = []
+        self._names: Dict[Tuple[str, int], str] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    @classmethod
+    def build(cls, names: Iterable[Tuple[str, int, str]], max_entries: int) -> 'PrefixIndex':
+        """Index (kind, id, name) rows, most important first, in one sort."""
+        index = cls(max_entries)
+        for kind, doc_id, name in names:
+            keys = name_keys(name or '')
+            if len(index._keys) + len(keys) > max_entries:
+                index.full = True
+                break
+            index._names[(kind, doc_id)] = name
+            index._keys.extend((key, kind, doc_id) for key in keys)
+        index._keys.sort()
+        return index
+
+    def add(self, kind: str, doc_id: int, name: str):
+        with self._lock:
+            keys = name_keys(name or '')
+            old = self._names.get((kind, doc_id))
+            # A name that doesn't fit leaves the entry it would replace.
+            freed = len(name_keys(old)) if old is not None else 0
+            if len(self._keys) - freed + len(keys) > self.max_entries:
+                self.full = True
+                return
+            self.remove(kind, doc_id)
+            self._names[(kind, doc_id)] = name
+            for key in keys:
+                bisect.insort(self._keys, (key, kind, doc_id))
+
+    def remove(self, kind: str, doc_id: int):
+        with self._lock:
+            name = self._names.pop((kind, doc_id), None)
+            if name is None:
+                return
+            for key in name_keys(name):
+                entry = (key, kind, doc_id)
+                i = bisect.bisect_left(self._keys, entry)
+                if i < len(self._keys) and self._keys[i] == entry:
+                    del self._keys[i]
+
+    def complete(self, prefix: str, limit: int, kinds: Optional[Set[str]] = None) -> List[Tuple[str, int, str]]:
+        """
+        Up to `limit` (kind, id, name) whose names have a word starting with
+        `prefix`. Names that start with it come first, then alphabetically.
+        """
+        prefix = prefix_key(prefix)
+        if not prefix:
+            return []
+        candidates = {}
+        with self._lock:
+            keys = self._keys
+            i = bisect.bisect_left(keys, (prefix,))
+            while i < len(keys) and keys[i][0].startswith(prefix):
+                key, kind, doc_id = keys[i]
+                if kinds is None or kind in kinds:
+                    name = self._names[(kind, doc_id)]
+                    starts = prefix_key(name).startswith(prefix)
+                    candidates[(kind, doc_id)] = (not starts, name.lower(), kind, doc_id, name)
+                i += 1
+        return [(kind, doc_id, name) for _, _, kind, doc_id, name in heapq.nsmallest(limit, candidates.values())]
+
+
+class Autocomplete:
+    """
+    PrefixIndex of venue and artist names, built with one query per model on
+    first use. Commits in this process are applied to it as they happen
+    (see _apply_pending); it is rebuilt every AUTOCOMPLETE_TTL seconds to
+    pick up writes made by other workers. When AUTOCOMPLETE_MAX_ENTRIES is
+    reached, the names with the most upcoming shows are kept.
+    """
+
+    KINDS = {Venue: 'venue', Artist: 'artist'}
+
+    def __init__(self):
+        self._index: Optional[PrefixIndex] = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def index(self) -> PrefixIndex:
+        ttl = current_app.config.get('AUTOCOMPLETE_TTL', 300)
+        index = self._index
+        if index is None or time.monotonic() - self._built_at > ttl:
+            with self._lock:
+                index = self._index
+                if index is None or time.monotonic() - self._built_at > ttl:
+                    index = self._index = self._build()
+                    self._built_at = time.monotonic()
+        return index
+
+    def _build(self) -> PrefixIndex:
+        rows = []
+        for model, kind in self.KINDS.items():
+            rows.extend((count, kind, doc_id, name) for doc_id, name, count in
+                        db.session.query(model.id, model.name, model.upcoming_show_count))
+        rows.sort(key=lambda row: (-row[0], row[1], row[2]))
+        return PrefixIndex.build(((kind, doc_id, name) for _, kind, doc_id, name in rows),
+                                 current_app.config.get('AUTOCOMPLETE_MAX_ENTRIES', 200000))
+
+    def apply(self, model, doc_id: int, fields: Optional[Dict]):
+        """Keep an already built index in step with a committed write."""
+        index = self._index
+        if index is not None:
+            if fields is None:
+                index.remove(self.KINDS[model], doc_id)
+            else:
+                index.add(self.KINDS[model], doc_id, fields['name'])
+
+    def reset(self):
+        self._index = None
+
+    def complete(self, prefix: str, limit: int, kinds: Optional[Set[str]] = None) -> List[Dict]:
+        return [
+            {'type': kind, 'id': doc_id, 'name': name}
+            for kind, doc_id, name in self.index().complete(prefix, limit, kinds)
+        ]
+
+#----------------------------------------------------------------------------#
+# Search entry point.
+#----------------------------------------------------------------------------#
+
+
+class SearchEngine:
+    """
+    Ranked search over venues and artists. Uses the Postgres full-text and
+    trigram indexes when available and the in-memory index otherwise; both
+    backends return the same result shape.
+    """
+
+    def __init__(self):
+        self.memory = InMemorySearchBackend()
+        self.postgres = PostgresSearchBackend()
+        self.autocomplete = Autocomplete()
+
+    @property
+    def backend(self):
+        name = current_app.config.get('SEARCH_BACKEND')
+        if name is None:
+            name = 'postgres' if db.engine.dialect.name == 'postgresql' else 'memory'
+        return self.postgres if name == 'postgres' else self.memory
+
+    def search(self, model, search_term: str, limit: int = SEARCH_LIMIT) -> Tuple[List[Dict], int]:
+        """
+        Return id, name and num_upcoming_shows of the `limit` most relevant
+        matches, and the number of matches. A term without any word, e.g.
+        empty or only punctuation, matches every row, listed by id.
+        """
+        if not tokenize(search_term):
+            return with_upcoming_show_count(model, limit=limit), model.query.count()
+
+        ranked, total = self.backend.search(model, search_term, limit)
+        if not ranked:
+            return [], 0
+
+        rows = {r['id']: r for r in with_upcoming_show_count(
+            model, model.id.in_([doc_id for doc_id, _ in ranked]))}
+        return [rows[doc_id] for doc_id, _ in ranked if doc_id in rows], total
+
+    def reset(self):
+        """Drop the in-memory indexes, e.g. after bulk writes that skip the session hooks."""
+        self.memory.reset()
+        self.autocomplete.reset()
+
+
+search_engine = SearchEngine()
+
+#----------------------------------------------------------------------------#
+# Index maintenance.
+#----------------------------------------------------------------------------#
+
+# Writes are collected per session during flushes and only applied to the
+# in-memory indexes once the transaction commits.
+FLUSHED_KEY = 'search_index_flushed'
+PENDING_KEY = 'search_index_pending'
+
+
+def _snapshot(target) -> Dict:
+    fields = {field: getattr(target, field) for field, _, _ in SEARCH_FIELDS}
+    fields['genres'] = target.genres
+    return fields
+
+
+def _record(mapper, connection, target, deleted=False):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(FLUSHED_KEY, []).append((target, deleted))
+
+
+def _record_delete(mapper, connection, target):
+    _record(mapper, connection, target, deleted=True)
+
+
+for _model in (Venue, Artist):
+    event.listen(_model, 'after_insert', _record)
+    event.listen(_model, 'after_update', _record)
+    event.listen(_model, 'after_delete', _record_delete)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _snapshot_flushed(session, flush_context):
+    # Snapshots are taken after the flush, where lazy loads are allowed.
+    pending = session.info.setdefault(PENDING_KEY, [])
+    for target, deleted in session.info.pop(FLUSHED_KEY, []):
+        pending.append((type(target), target.id, None if deleted else _snapshot(target)))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending(session):
+    for model, doc_id, fields in session.info.pop(PENDING_KEY, []):
+        search_engine.memory.apply(model, doc_id, fields)
+        search_engine.autocomplete.apply(model, doc_id, fields)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(FLUSHED_KEY, None)
+    session.info.pop(PENDING_KEY, None)
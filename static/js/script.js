@@ -2,3 +2,29 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Suggest venue and artist names in the search boxes as the user types.
+document.querySelectorAll('input[data-autocomplete]').forEach(function(input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  var timer;
+  input.addEventListener('input', function() {
+    clearTimeout(timer);
+    timer = setTimeout(function() {
+      if (!input.value.trim()) {
+        list.innerHTML = '';
+        return;
+      }
+      fetch('/api/v1/autocomplete?type=' + input.dataset.autocomplete +
+            '&q=' + encodeURIComponent(input.value))
+        .then(function(response) { return response.json(); })
+        .then(function(body) {
+          list.innerHTML = '';
+          body.data.forEach(function(item) {
+            var option = document.createElement('option');
+            option.value = item.name;
+            list.appendChild(option);
+          });
+        });
+    }, 100);
+  });
+});
@@ -0,0 +1,80 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app
+from cache import response_cache
+from directory import venue_directory
+from models import Artist, Show, Venue, db
+from search import search_engine
+
+
+def reset_process_state():
+    """Drop the in-process indexes and caches, which outlive an app."""
+    search_engine.reset()
+    venue_directory._snapshot = None
+    response_cache._backend = None
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """
+    The app on an empty temporary SQLite database, or on TEST_DATABASE_URL
+    (e.g. a scratch PostgreSQL database, whose tables are dropped after
+    each test).
+    """
+    # create_app logs to error.log in the working directory.
+    monkeypatch.chdir(tmp_path)
+    reset_process_state()
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': os.environ.get('TEST_DATABASE_URL') or f'sqlite:///{tmp_path / "fyyur.db"}',
+        'SECRET_KEY': 'test',
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    reset_process_state()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def seed(app):
+    """
+    Factory inserting `venues` venues and `artists` artists, then `shows`
+    shows spread over them round robin, alternately past and upcoming.
+    Returns the venue and artist ids.
+    """
+
+    def seed(venues=3, artists=3, shows=6):
+        venue_rows = [
+            Venue(name=f'Venue {i}', city='San Francisco', state='CA', address=f'{i} Main St',
+                  email=f'venue{i}@example.com', genres=['Jazz', 'Rock n Roll'])
+            for i in range(venues)
+        ]
+        artist_rows = [
+            Artist(name=f'Artist {i}', city='San Francisco', state='CA',
+                   email=f'artist{i}@example.com', genres=['Jazz'])
+            for i in range(artists)
+        ]
+        db.session.add_all(venue_rows + artist_rows)
+        db.session.commit()
+
+        now = datetime.utcnow().replace(microsecond=0)
+        for i in range(shows):
+            days = (i // 2 + 1) * (1 if i % 2 else -1)
+            db.session.add(Show(venue_id=venue_rows[i % venues].id,
+                                artist_id=artist_rows[i % artists].id,
+                                start_time=now + timedelta(days=days)))
+        db.session.commit()
+        return [v.id for v in venue_rows], [a.id for a in artist_rows]
+
+    return seed
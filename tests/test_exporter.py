@@ -0,0 +1,41 @@
+import json
+from datetime import datetime
+
+from exporter import export
+from models import Show, db
+
+
+def test_http_export_is_off_by_default(client, seed):
+    seed()
+    assert client.get('/export/venues.csv').status_code == 404
+
+
+def test_http_export(app, client, seed):
+    seed(venues=2, artists=1, shows=0)
+    app.config['EXPORTS_ENABLED'] = True
+    response = client.get('/export/venues.csv')
+    assert response.status_code == 200
+    lines = response.data.decode().splitlines()
+    assert lines[0].startswith('id,name,')
+    assert len(lines) == 3
+    assert client.get('/export/venues.xml').status_code == 404
+
+
+def test_ndjson_genres_are_lists(app, seed):
+    seed(venues=1, artists=1, shows=0)
+    records = [json.loads(line) for line in ''.join(export('venues', 'ndjson')).splitlines()]
+    assert sorted(records[0]['genres']) == ['Jazz', 'Rock n Roll']
+    csv_lines = ''.join(export('venues', 'csv')).splitlines()
+    assert 'Jazz,Rock n Roll' in csv_lines[1] or 'Rock n Roll,Jazz' in csv_lines[1]
+
+
+def test_shows_export_keeps_shows_without_a_venue_or_artist(app, seed):
+    venue_ids, artist_ids = seed(venues=1, artists=1, shows=2)
+    db.session.add(Show(venue_id=None, artist_id=artist_ids[0], start_time=datetime(2030, 1, 1)))
+    db.session.add(Show(venue_id=venue_ids[0], artist_id=None, start_time=datetime(2030, 1, 2)))
+    db.session.commit()
+
+    records = [json.loads(line) for line in ''.join(export('shows', 'ndjson')).splitlines()]
+    assert len(records) == 4
+    assert records[2]['venue_name'] is None and records[2]['artist_name'] == 'Artist 0'
+    assert records[3]['artist_name'] is None
@@ -0,0 +1,139 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+from importer import allocate_ids, import_command
+from models import Show, Venue, db
+
+
+def write_lines(path, rows):
+    path.write_text(''.join(json.dumps(row) + '\n' for row in rows))
+    return str(path)
+
+
+def venue_row(i, **fields):
+    row = {'name': f'Hall {i}', 'city': 'San Francisco', 'state': 'CA',
+           'address': f'{i} Main St', 'email': f'hall{i}@example.com', 'genres': 'Jazz,Folk'}
+    row.update(fields)
+    return row
+
+
+def rejected(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_import_venues(app, tmp_path):
+    path = write_lines(tmp_path / 'venues.jsonl', [venue_row(i) for i in range(5)])
+    result = app.test_cli_runner().invoke(import_command, ['venues', path, '--chunk-size', '2'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Imported 5 venues.' in result.output
+    venues = Venue.query.order_by(Venue.id).all()
+    assert [v.name for v in venues] == [f'Hall {i}' for i in range(5)]
+    assert venues[0].genres == ['Folk', 'Jazz']
+    # Placed by the local geocoding table.
+    assert venues[0].latitude is not None
+    assert not (tmp_path / 'venues.jsonl.rejected.jsonl').exists()
+
+
+def test_invalid_rows_are_rejected(app, tmp_path):
+    rows = [venue_row(0), venue_row(1, email=''), venue_row(2, genres='Polka')]
+    path = write_lines(tmp_path / 'venues.jsonl', rows)
+    result = app.test_cli_runner().invoke(import_command, ['venues', path])
+
+    assert 'Imported 1 venues.' in result.output
+    errors = rejected(f'{path}.rejected.jsonl')
+    assert [e['line'] for e in errors] == [2, 3]
+    assert 'email' in errors[0]['errors']
+    assert 'genres' in errors[1]['errors']
+
+
+def test_failed_commit_rejects_each_row_once(app, tmp_path, monkeypatch):
+    rows = [venue_row(0), venue_row(1, email=''), venue_row(2), venue_row(3)]
+    path = write_lines(tmp_path / 'venues.jsonl', rows)
+
+    commit = db.session.commit
+    calls = []
+
+    def failing_commit():
+        calls.append(1)
+        # The first chunk's commit fails.
+        if len(calls) == 1:
+            raise OperationalError('COMMIT', {}, Exception('connection lost'))
+        commit()
+
+    monkeypatch.setattr(db.session, 'commit', failing_commit)
+    result = app.test_cli_runner().invoke(import_command, ['venues', path, '--chunk-size', '3'])
+
+    assert 'Imported 1 venues.' in result.output
+    errors = rejected(f'{path}.rejected.jsonl')
+    assert sorted(e['line'] for e in errors) == [1, 2, 3]
+    assert [e['line'] for e in errors if 'email' in e['errors']] == [2]
+    assert sorted(e['line'] for e in errors if 'database' in e['errors']) == [1, 3]
+    assert [v.name for v in Venue.query] == ['Hall 3']
+
+
+def test_import_shows_by_name_and_rejects_double_bookings(app, seed, tmp_path):
+    seed(venues=1, artists=2, shows=0)
+    start = (datetime.utcnow() + timedelta(days=7)).replace(microsecond=0)
+    rows = [
+        {'venue_name': 'Venue 0', 'artist_name': 'Artist 0', 'start_time': str(start)},
+        {'venue_name': 'Venue 0', 'artist_name': 'Artist 1', 'start_time': str(start + timedelta(minutes=30))},
+        {'venue_name': 'Nowhere', 'artist_name': 'Artist 1', 'start_time': str(start + timedelta(days=1))},
+    ]
+    path = write_lines(tmp_path / 'shows.jsonl', rows)
+    result = app.test_cli_runner().invoke(import_command, ['shows', path])
+
+    assert 'Imported 1 shows.' in result.output
+    errors = {e['line']: e['errors'] for e in rejected(f'{path}.rejected.jsonl')}
+    assert sorted(errors) == [2, 3]
+    assert 'venue' in errors[2]
+    assert errors[3] == {'venue_name': ['No match.']}
+    assert Show.query.count() == 1
+    assert Venue.query.one().upcoming_show_count == 1
+
+
+def test_malformed_lines_are_rejected(app, tmp_path):
+    path = tmp_path / 'venues.jsonl'
+    path.write_text('\n'.join([
+        json.dumps(venue_row(0)),
+        '{"name": "Broken',
+        '[1, 2]',
+        json.dumps(venue_row(3, genres=5)),
+        json.dumps(venue_row(4, name={'first': 'Hall'})),
+        json.dumps(venue_row(5)),
+    ]) + '\n')
+    result = app.test_cli_runner().invoke(import_command, ['venues', str(path), '--chunk-size', '10'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Imported 2 venues.' in result.output
+    assert sorted(v.name for v in Venue.query) == ['Hall 0', 'Hall 5']
+    errors = {e['line']: e for e in rejected(f'{path}.rejected.jsonl')}
+    assert sorted(errors) == [2, 3, 4, 5]
+    assert errors[2]['row'] == '{"name": "Broken'
+    assert errors[2]['errors']['row'][0].startswith('Invalid JSON')
+    assert errors[3]['errors'] == {'row': ['Expected a JSON object.']}
+    assert 'genres' in errors[4]['errors']
+    assert 'name' in errors[5]['errors']
+    assert not any('database' in e['errors'] for e in errors.values())
+
+
+def test_sqlite_ids_are_reserved_until_commit(app):
+    if db.engine.dialect.name != 'sqlite':
+        pytest.skip('SQLite only')
+    ids = allocate_ids(Venue, 3)
+    # Another connection, e.g. a web request creating a venue, waits for the
+    # import's commit rather than taking one of the reserved ids.
+    other = create_engine(app.config['SQLALCHEMY_DATABASE_URI'], connect_args={'timeout': 0.1})
+    with pytest.raises(OperationalError, match='locked'):
+        with other.begin() as connection:
+            connection.execute(Venue.__table__.insert().values(name='Walk-in', email='w@example.com'))
+    db.session.rollback()
+    with other.begin() as connection:
+        connection.execute(Venue.__table__.insert().values(name='Walk-in', email='w@example.com'))
+    other.dispose()
+    assert ids == [1, 2, 3]
@@ -0,0 +1,75 @@
+import os
+import re
+
+import pytest
+
+from app import create_app
+from metrics import Exposition, mark_process_dead, read_worker_files
+from models import db
+
+
+@pytest.fixture
+def metrics_app(app, tmp_path):
+    """The app with metrics shared through a METRICS_DIR."""
+    app = create_app({
+        **app.config,
+        'METRICS_ENABLED': True,
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def sample(body, name, **labels):
+    """The value of the `name` sample with the given labels, or None."""
+    for line in body.splitlines():
+        match = re.match(r'(\w+)(\{.*\})? (\S+)$', line)
+        if match and match[1] == name and all(f'{k}="{v}"' in (match[2] or '') for k, v in labels.items()):
+            return float(match[3])
+    return None
+
+
+def other_worker(directory, pid, requests, checked_out):
+    out = Exposition()
+    out.add('fyyur_http_requests_total', 'counter', requests, route='main.index', method='GET', status=200)
+    out.add('fyyur_db_pool_checked_out', 'gauge', checked_out, bind='primary')
+    with open(os.path.join(directory, f'{pid}.json'), 'w') as f:
+        f.write(out.to_json())
+
+
+def test_metrics_are_summed_over_workers(metrics_app):
+    client = metrics_app.test_client()
+    index = {'route': 'main.index', 'method': 'GET', 'status': 200}
+    # The metrics of this process outlive an app.
+    assert client.get('/').status_code == 200
+    before = sample(client.get('/metrics').get_data(as_text=True), 'fyyur_http_requests_total', **index)
+    directory = metrics_app.config['METRICS_DIR']
+    other_worker(directory, 1, requests=5, checked_out=2)
+    assert client.get('/').status_code == 200
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert sample(body, 'fyyur_http_requests_total', **index) == before + 6
+    assert body.count('# TYPE fyyur_http_requests_total counter') == 1
+    assert sample(body, 'fyyur_db_pool_checked_out', bind='primary') >= 2
+    assert os.path.exists(os.path.join(directory, f'{os.getpid()}.json'))
+
+    # An exited worker keeps counting towards the counters, but not the gauges.
+    mark_process_dead(directory, 1)
+    assert sample(read_worker_files(directory).render(), 'fyyur_http_requests_total', **index) == before + 6
+    with open(os.path.join(directory, '1.json')) as f:
+        dead = Exposition.from_json(f.read())
+    assert list(dead.families) == ['fyyur_http_requests_total']
+
+
+def test_histograms_merge_bucket_by_bucket():
+    one, two = Exposition(), Exposition()
+    one.add_histogram('latency', [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0.004], route='a')
+    two.add_histogram('latency', [0, 2, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0.018], route='a')
+    total = Exposition.from_json(one.to_json())
+    total.merge(Exposition.from_json(two.to_json()))
+    body = total.render()
+    assert 'latency_bucket{route="a",le="0.005"} 1' in body
+    assert 'latency_bucket{route="a",le="0.01"} 3' in body
+    assert 'latency_count{route="a"} 3' in body
+    assert sample(body, 'latency_sum', route='a') == pytest.approx(0.022)
@@ -0,0 +1,48 @@
+from models import Show, Venue, db
+
+
+def test_detail_pages_skip_shows_without_a_start_time(client, seed):
+    venue_ids, artist_ids = seed(venues=1, artists=1, shows=2)
+    db.session.add(Show(venue_id=venue_ids[0], artist_id=artist_ids[0], start_time=None))
+    db.session.commit()
+
+    for path in (f'/venues/{venue_ids[0]}', f'/artists/{artist_ids[0]}'):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.data.count(b'/artists/' if 'venues' in path else b'/venues/') >= 2
+
+
+def test_concurrent_edits_get_their_own_versions(app, seed):
+    venue_ids, _ = seed(venues=1, artists=1, shows=0)
+    first = db.session.get(Venue, venue_ids[0])
+    version = first.version
+
+    # Another worker edits the venue after this session loaded it.
+    other = db.session.session_factory()
+    second = other.get(Venue, venue_ids[0])
+    second.phone = '555-0100'
+    other.commit()
+    other.close()
+
+    first.name = 'Renamed'
+    db.session.commit()
+    assert db.session.get(Venue, venue_ids[0]).version == version + 2
+
+
+def test_detail_etag_changes_on_edit(client, seed):
+    venue_ids, _ = seed(venues=1, artists=1, shows=0)
+    etag = client.get(f'/venues/{venue_ids[0]}').headers['ETag']
+    venue = db.session.get(Venue, venue_ids[0])
+    venue.phone = '555-0100'
+    db.session.commit()
+    assert client.get(f'/venues/{venue_ids[0]}', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_cache_stats_are_served_in_debug_mode_only(app, client, seed):
+    seed(venues=1, artists=1, shows=0)
+    assert client.get('/cache/stats').status_code == 404
+    app.debug = True
+    client.get('/venues')
+    assert client.get('/cache/stats').get_json()['misses'] >= 1
+    app.config['CACHE_ENABLED'] = False
+    assert client.get('/cache/stats').status_code == 404
@@ -0,0 +1,51 @@
+import re
+from datetime import datetime
+
+import pytest
+
+from models import Show, Venue, db
+from pagination import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize('path', ['/api/v1/venues', '/api/v1/artists', '/api/v1/shows'])
+def test_api_rejects_bad_cursors_with_json(client, path):
+    response = client.get(f'{path}?after=not-a-cursor')
+    assert response.status_code == 400
+    assert response.is_json
+    assert response.get_json()['error'].startswith('Invalid cursor')
+
+
+@pytest.mark.parametrize('path', ['/venues', '/artists', '/shows', '/venues/nearby?lat=37.7&lng=-122.4'])
+def test_pages_reject_bad_cursors(client, path):
+    separator = '&' if '?' in path else '?'
+    assert client.get(f'{path}{separator}after=not-a-cursor').status_code == 400
+
+
+
+def test_cursor_round_trips_none(app):
+    token = encode_cursor([None, datetime(2026, 5, 1, 20, 30), 7])
+    assert decode_cursor(token, (Venue.city, Show.start_time, Show.id)) == \
+        [None, datetime(2026, 5, 1, 20, 30), 7]
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor([1]), (Show.start_time, Show.id))
+
+
+@pytest.mark.parametrize('path', ['/shows', '/api/v1/shows'])
+def test_shows_without_a_start_time_dont_break_paging(client, seed, path):
+    seed(venues=2, artists=2, shows=5)
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=None))
+    db.session.commit()
+
+    seen, url = [], f'{path}?limit=2'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        if response.is_json:
+            body = response.get_json()
+            seen.extend(show['id'] for show in body['data'])
+            url = body['next'] and f'{path}?limit=2&after={body["next"]}'
+        else:
+            seen.extend(range(response.data.count(b'tile-show')))
+            match = re.search(rb'href="([^"]*after=[^"]*)"', response.data)
+            url = match and match.group(1).decode().replace('&amp;', '&')
+    assert len(seen) == 5
@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from models import db
+
+
+@pytest.fixture
+def profiled_app(app):
+    app = create_app({**app.config, 'PROFILING_ENABLED': True})
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def test_failed_statements_are_not_left_running(profiled_app):
+    with profiled_app.test_request_context('/'):
+        profiled_app.preprocess_request()
+        connection = db.session.connection()
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql('SELECT * FROM missing')
+        assert connection.info.get('profile_started') == []
+        db.session.rollback()
+
+
+def test_profiler_page_is_served_in_debug_mode_only(profiled_app):
+    client = profiled_app.test_client()
+    assert client.get('/_profiler').status_code == 404
+    profiled_app.debug = True
+    assert client.get('/_profiler').status_code == 200
@@ -0,0 +1,67 @@
+"""
+The Show queries behind the busiest pages must stay on the Show indexes
+(ix_show_venue_id_start_time, ix_show_artist_id_start_time and
+ix_show_start_time_id). Each page is fetched while recording the
+statements it runs against "Show", and every one of them is EXPLAINed.
+
+On PostgreSQL sequential scans are disabled for the EXPLAIN, so a plan
+that still has a Seq Scan on "Show" has no index to use; on SQLite a
+plain SCAN of Show means the same.
+"""
+import pytest
+from sqlalchemy import event
+
+from models import db
+
+PAGES = [
+    ('/venues/{venue_id}', 'ix_show_venue_id_start_time'),
+    ('/artists/{artist_id}', 'ix_show_artist_id_start_time'),
+    ('/shows', 'ix_show_start_time_id'),
+]
+
+
+def show_statements(client, path):
+    """The (statement, parameters) run against "Show" while serving `path`."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if '"Show"' in statement:
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return statements
+
+
+def explain(statement, parameters):
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters)
+        return [row[0] for row in rows]
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    return [line for line in plan
+            if 'Seq Scan on "Show"' in line or (line.startswith('SCAN Show') and 'INDEX' not in line)]
+
+
+@pytest.mark.parametrize('page, index', PAGES)
+def test_show_queries_use_an_index(client, seed, page, index):
+    venue_ids, artist_ids = seed(venues=5, artists=5, shows=40)
+    path = page.format(venue_id=venue_ids[0], artist_id=artist_ids[0])
+
+    statements = show_statements(client, path)
+    assert statements, f'{path} ran no Show queries'
+
+    plans = [explain(statement, parameters) for statement, parameters in statements]
+    for (statement, _), plan in zip(statements, plans):
+        assert not full_scans(plan), f'{path}: full scan of Show\n{statement}\n' + '\n'.join(plan)
+    assert any(index in line for plan in plans for line in plan), \
+        f'{path} does not use {index}\n' + '\n\n'.join('\n'.join(plan) for plan in plans)
@@ -0,0 +1,104 @@
+"""
+Read/write routing between the primary and a replica, here two SQLite
+databases holding different names for the same venue, so each page shows
+which one it read.
+"""
+from datetime import datetime
+
+import pytest
+from flask import g
+from sqlalchemy.orm import Session
+
+from app import create_app
+from models import Artist, Show, Venue, db
+
+VENUE = {'id': 1, 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main St',
+         'email': 'hall@example.com', 'genres': ['Jazz']}
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """Factory building the app on a primary and one replica."""
+    monkeypatch.chdir(tmp_path)
+
+    def replicated(**config):
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "primary.db"}',
+            'SQLALCHEMY_REPLICA_URIS': [f'sqlite:///{tmp_path / "replica.db"}'],
+            'SECRET_KEY': 'test',
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+            'REPLICA_STICKY_SECONDS': 0,
+            **config,
+        })
+        with app.app_context():
+            for bind, name in ((None, 'Primary Hall'), ('replica_0', 'Replica Hall')):
+                engine = db.get_engine(app, bind=bind)
+                db.Model.metadata.create_all(engine)
+                with Session(engine) as session:
+                    session.add(Venue(name=name, **VENUE))
+                    session.commit()
+        return app
+
+    return replicated
+
+
+def venue_name(app, bind):
+    with app.app_context(), db.get_engine(app, bind=bind).connect() as connection:
+        return connection.execute(db.select(Venue.name).where(Venue.id == 1)).scalar()
+
+
+def edit(client, name):
+    data = {**VENUE, 'name': name, 'genres': 'Jazz'}
+    return client.post('/venues/1/edit', data=data)
+
+
+def test_read_only_views_read_from_the_replica(replicated):
+    client = replicated().test_client()
+    assert b'Replica Hall' in client.get('/venues/1').data
+    # Not read-only.
+    assert b'Primary Hall' in client.get('/venues/1/edit').data
+
+
+def test_writes_go_to_the_primary(replicated):
+    app = replicated()
+    assert edit(app.test_client(), 'Renamed Hall').status_code == 302
+    assert venue_name(app, None) == 'Renamed Hall'
+    assert venue_name(app, 'replica_0') == 'Replica Hall'
+
+
+def test_reads_after_a_write_in_the_session_go_to_the_primary(replicated):
+    app = replicated()
+    with app.test_request_context('/venues/1'):
+        g.read_only = True
+        assert db.session.query(Venue.name).filter_by(id=1).scalar() == 'Replica Hall'
+        db.session.add(Venue(name='New Hall', **{**VENUE, 'id': 2}))
+        db.session.flush()
+        assert db.session.query(Venue.name).filter_by(id=1).scalar() == 'Primary Hall'
+        assert db.session.query(Venue.name).filter_by(id=2).scalar() == 'New Hall'
+        db.session.rollback()
+
+
+def test_reads_stick_to_the_primary_after_a_write(replicated):
+    client = replicated(REPLICA_STICKY_SECONDS=60).test_client()
+    assert b'Replica Hall' in client.get('/venues/1').data
+    edit(client, 'Renamed Hall')
+    # The redirect after the write, and what follows, read the primary.
+    assert b'Renamed Hall' in client.get('/venues/1').data
+
+    other = client.application.test_client()
+    assert b'Replica Hall' in other.get('/venues/1').data
+
+
+def test_slot_checks_read_the_primary(replicated):
+    app = replicated()
+    # A show booked on the primary, not yet on the replica.
+    with app.app_context(), Session(db.get_engine(app)) as session:
+        session.add(Artist(id=1, name='Artist', city='San Francisco', state='CA',
+                           email='artist@example.com', genres=['Jazz']))
+        session.add(Show(venue_id=1, artist_id=1, start_time=datetime(2030, 1, 1, 20)))
+        session.commit()
+
+    slot = {'venue_id': 1, 'artist_id': 1, 'start_time': '2030-01-01T20:30:00'}
+    response = app.test_client().post('/api/v1/shows/check', json={'slots': [slot]})
+    assert response.get_json()['data'][0]['available'] is False
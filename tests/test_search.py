@@ -0,0 +1,130 @@
+from models import Venue, db
+from search import SEARCH_LIMIT, InMemorySearchIndex, PrefixIndex, search_engine, tokenize
+
+
+def build_index(**documents):
+    index = InMemorySearchIndex()
+    for doc_id, fields in documents.items():
+        index.add(int(doc_id.lstrip('d')), fields)
+    return index
+
+
+def test_tokenize_lowercases_and_drops_punctuation():
+    assert tokenize("The Dueling Pianos' Bar & Grill!") == ['the', 'dueling', 'pianos', 'bar', 'grill']
+    assert tokenize('Café Nº5') == ['café', 'nº5']
+    assert tokenize('') == []
+    assert tokenize(None) == []
+    assert tokenize('?! --') == []
+
+
+def test_name_outranks_city_and_genre():
+    index = build_index(
+        d1={'name': 'Park Hall', 'city': 'Oakland'},
+        d2={'name': 'Oakland Arena', 'city': 'San Jose'},
+        d3={'name': 'Blue Note', 'genres': ['Folk']},
+    )
+    assert [doc_id for doc_id, _ in index.search('oakland')] == [2, 1]
+    assert [doc_id for doc_id, _ in index.search('folk')] == [3]
+
+
+def test_whole_word_outranks_prefix_and_ties_go_by_id():
+    index = build_index(
+        d1={'name': 'Jazzy Club'},
+        d2={'name': 'Jazz Club'},
+        d3={'name': 'Jazz Cellar'},
+    )
+    assert [doc_id for doc_id, _ in index.search('jazz')] == [2, 3, 1]
+
+
+def test_every_token_must_match_as_a_prefix():
+    index = build_index(
+        d1={'name': 'The Musical Hop', 'city': 'San Francisco'},
+        d2={'name': 'Park Square Live Music & Coffee', 'city': 'San Francisco'},
+        d3={'name': 'The Dueling Pianos Bar', 'city': 'New York'},
+    )
+    assert sorted(doc_id for doc_id, _ in index.search('mus')) == [1, 2]
+    assert [doc_id for doc_id, _ in index.search('mus hop')] == [1]
+    assert [doc_id for doc_id, _ in index.search('san fran')] == [1, 2]
+    assert [doc_id for doc_id, _ in index.search('pianos york')] == [3]
+
+
+def test_trigram_fallback_when_nothing_matches():
+    index = build_index(
+        d1={'name': 'Dueling Pianos'},
+        d2={'name': 'Musical Hop'},
+    )
+    assert [doc_id for doc_id, _ in index.search('dueling pianso')] == [1]
+    assert index.search('xyzzy') == []
+
+
+def test_remove_and_reindex():
+    index = build_index(d1={'name': 'Blue Room'}, d2={'name': 'Blue Moon'})
+    index.add(1, {'name': 'Red Room'})
+    assert [doc_id for doc_id, _ in index.search('blue')] == [2]
+    index.remove(2)
+    assert index.search('blue') == []
+    assert len(index) == 1
+
+
+def test_limit():
+    index = build_index(**{f'd{i}': {'name': f'Hall {i}'} for i in range(1, 11)})
+    assert [doc_id for doc_id, _ in index.search('hall', limit=3)] == [1, 2, 3]
+
+
+def test_empty_or_punctuation_term_is_capped(app, seed):
+    seed(venues=5, artists=1, shows=0)
+    for term in ('', '   ', '%', '?!'):
+        results, count = search_engine.search(Venue, term, limit=2)
+        assert [r['name'] for r in results] == ['Venue 0', 'Venue 1']
+        assert count == 5
+
+
+def test_count_is_the_number_of_matches(app, client, seed):
+    seed(venues=SEARCH_LIMIT + 5, artists=1, shows=0)
+    results, count = search_engine.search(Venue, 'venue', limit=3)
+    assert len(results) == 3
+    assert count == SEARCH_LIMIT + 5
+
+    for term in ('venue', ''):
+        page = client.post('/venues/search', data={'search_term': term}).get_data(as_text=True)
+        assert f': {SEARCH_LIMIT + 5}</h3>' in page
+        assert f'Showing the first {SEARCH_LIMIT}.' in page
+        assert page.count('href="/venues/') == SEARCH_LIMIT
+
+
+def test_engine_follows_commits_and_rebuilds_after_ttl(app, seed):
+    app.config['SEARCH_BACKEND'] = 'memory'
+    venue_ids, _ = seed(venues=2, artists=1, shows=0)
+    assert len(search_engine.search(Venue, 'venue')[0]) == 2
+
+    venue = db.session.get(Venue, venue_ids[0])
+    venue.name = 'Blue Room'
+    db.session.commit()
+    assert [r['id'] for r in search_engine.search(Venue, 'blue')[0]] == [venue_ids[0]]
+
+    # Writes that bypass the session, e.g. from another worker, show up once
+    # the index expires.
+    db.session.execute(Venue.__table__.update().where(Venue.id == venue_ids[1]).values(name='Blue Moon'))
+    db.session.commit()
+    assert len(search_engine.search(Venue, 'blue')[0]) == 1
+    app.config['SEARCH_INDEX_TTL'] = 0
+    assert len(search_engine.search(Venue, 'blue')[0]) == 2
+
+
+def test_prefix_index_keeps_a_renamed_entry_that_does_not_fit():
+    index = PrefixIndex.build([('venue', 1, 'Blue Room'), ('venue', 2, 'Red Room')], max_entries=4)
+    index.add('venue', 1, 'The Great Blue Room')
+    assert index.full
+    assert index.complete('blue', 5) == [('venue', 1, 'Blue Room')]
+    # A rename to a name of no more keys fits in the space it frees.
+    index.add('venue', 2, 'Green Room')
+    assert index.complete('green', 5) == [('venue', 2, 'Green Room')]
+    assert index.complete('red', 5) == []
+
+
+def test_prefix_index_completes_past_many_common_matches():
+    names = [('artist', i, f'Blue Band {i:03}') for i in range(1, 101)] + [('venue', 1, 'The Blue Zoo')]
+    index = PrefixIndex.build(names, max_entries=1000)
+    # Every key starting with "blue" is considered, not only the first ones.
+    assert index.complete('blue', 3, kinds={'venue'}) == [('venue', 1, 'The Blue Zoo')]
+    assert index.complete('blue', 2) == [('artist', 1, 'Blue Band 001'), ('artist', 2, 'Blue Band 002')]
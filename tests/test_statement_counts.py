@@ -0,0 +1,79 @@
+"""
+The search and detail pages must run the same number of statements
+whatever the number of results: one result and many results are fetched
+with a before_cursor_execute listener counting statements.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from models import Artist, Show, Venue, db
+
+MORE = 20
+
+PAGES = [
+    ('POST', '/venues/search', {'search_term': 'venue'}),
+    ('POST', '/artists/search', {'search_term': 'artist'}),
+    ('GET', '/venues/{venue_id}', None),
+    ('GET', '/artists/{artist_id}', None),
+]
+
+
+def count_statements(client, method, path, data) -> int:
+    count = [0]
+
+    def record(*args):
+        count[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.open(path, method=method, data=data)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return count[0]
+
+
+def add_results(venue_id, artist_id, count):
+    """
+    Add `count` venues and artists, each with a show with the given artist
+    or at the given venue, half of them past.
+    """
+    venues = [Venue(name=f'Venue {i}', city='Oakland', state='CA', address=f'{i} Broadway',
+                    email=f'more{i}@example.com', genres=['Folk']) for i in range(count)]
+    artists = [Artist(name=f'Artist {i}', city='Oakland', state='CA',
+                      email=f'more{i}@example.com', genres=['Folk']) for i in range(count)]
+    db.session.add_all(venues + artists)
+    db.session.commit()
+
+    now = datetime.utcnow().replace(microsecond=0)
+    for i, (venue, artist) in enumerate(zip(venues, artists)):
+        start = now + timedelta(days=(i + 10) * (1 if i % 2 else -1))
+        db.session.add(Show(venue_id=venue_id, artist_id=artist.id, start_time=start))
+        db.session.add(Show(venue_id=venue.id, artist_id=artist_id, start_time=start + timedelta(hours=12)))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('method, page, data', PAGES)
+def test_statement_count_does_not_grow_with_results(client, seed, method, page, data):
+    venue_ids, artist_ids = seed(venues=1, artists=1, shows=1)
+    path = page.format(venue_id=venue_ids[0], artist_id=artist_ids[0])
+
+    # The first request builds the in-process indexes.
+    count_statements(client, method, path, data)
+    one = count_statements(client, method, path, data)
+
+    add_results(venue_ids[0], artist_ids[0], MORE)
+    count_statements(client, method, path, data)
+    many = count_statements(client, method, path, data)
+
+    assert one == many, f'{path}: {one} statements with one result, {many} with {MORE + 1}'
+
+
+def test_results_were_added(client, seed):
+    venue_ids, artist_ids = seed(venues=1, artists=1, shows=1)
+    add_results(venue_ids[0], artist_ids[0], MORE)
+    response = client.post('/venues/search', data={'search_term': 'venue'})
+    assert response.data.count(b'href="/venues/') >= MORE + 1
+    assert Show.query.filter_by(venue_id=venue_ids[0]).count() == MORE + 1
@@ -0,0 +1,13 @@
+"""
+WSGI entry point for production servers, e.g.
+
+    $ gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+
+from app import create_app
+
+if not os.environ.get('SECRET_KEY'):
+    raise RuntimeError('Set SECRET_KEY so that every worker signs sessions with the same key.')
+
+app = create_app()